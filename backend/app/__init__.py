@@ -1,3 +1,7 @@
+# 选择 SocketIO 异步模式，必须在导入 pymongo、redis 等库之前完成猴子补丁
+from async_mode import apply_async_mode
+ASYNC_MODE = apply_async_mode()
+
 from flask import Flask
 from flask_mongoengine import MongoEngine
 from flask_restful import Api
@@ -11,15 +15,20 @@ from config import Config # 导入配置
 db = MongoEngine()
 api_restful = Api() # Flask-Restful Api 对象
 jwt = JWTManager()
-# 初始化 SocketIO，使用线程模式，允许所有源
-socketio = SocketIO(cors_allowed_origins="*", async_mode='threading', logger=True, engineio_logger=True)
+# 初始化 SocketIO，异步模式由 SOCKETIO_ASYNC_MODE 配置决定，允许所有源
+socketio = SocketIO(cors_allowed_origins="*", async_mode=ASYNC_MODE, logger=True, engineio_logger=True)
 redis_client = None # Redis 客户端将在 create_app 中初始化
 
-def create_app(config_class=Config):
-    """应用工厂函数"""
+def create_app(config_class=Config, background_jobs_enabled=None):
+    """应用工厂函数；background_jobs_enabled=False 时不启动全量扫描类后台任务（命令行脚本使用），
+    为 None 时由 BACKGROUND_JOBS 配置决定"""
     app = Flask(__name__)
     app.config.from_object(config_class) # 从配置对象加载配置
 
+    # JSON 响应使用 orjson 编码（未安装时回退到标准库），原生支持 ObjectId、datetime 和 SON
+    from .utils.fast_json import FastJSONProvider
+    app.json = FastJSONProvider(app)
+
     # 启用 CORS
     CORS(app, resources={r"/*": {"origins": "*"}})
 
@@ -27,10 +36,11 @@ def create_app(config_class=Config):
     db.init_app(app)
     jwt.init_app(app)
     
-    # 初始化 SocketIO，但不使用 Redis（不需要消息队列）
-    socketio.init_app(app, cors_allowed_origins="*")
+    # 初始化 SocketIO；集群模式下使用 Redis 作为消息队列，使 emit 能到达其他进程上的客户端
+    message_queue = app.config['REDIS_URL'] if app.config.get('REALTIME_CLUSTERED') else None
+    socketio.init_app(app, cors_allowed_origins="*", message_queue=message_queue)
     
-    # 初始化 Redis 客户端 (仍然保留 Redis 连接，用于其他功能，但不用于 SocketIO)
+    # 初始化 Redis 客户端
     global redis_client
     redis_client = redis.from_url(app.config['REDIS_URL'])
     try:
@@ -40,6 +50,67 @@ def create_app(config_class=Config):
         print(f"Could not connect to Redis: {e}")
         # 根据实际需求处理连接失败的情况，例如记录日志或退出应用
 
+    # 全量扫描类后台任务：由 background_jobs 决定是否启动，多进程部署时只在一个进程中运行
+    from .services.background_jobs import background_jobs
+
+    # 在后台校对商品集合的索引（不阻塞启动）
+    from .models.item_model import Item
+    from .services.index_planner import start_index_reconciliation
+    background_jobs.register('index reconciliation', lambda: start_index_reconciliation(app, [Item]))
+
+    # 在后台为历史消息补写会话键和会话摘要
+    from .services.conversation_service import start_conversation_backfill
+    background_jobs.register('conversation backfill', start_conversation_backfill)
+
+    # 在后台把用户文档中内嵌的浏览历史迁移到独立集合
+    from .services.browse_history_service import start_history_migration
+    background_jobs.register('browse history migration', start_history_migration)
+
+    # 在后台把用户文档中内嵌的收藏列表迁移到独立集合，并重算商品收藏数
+    from .services.favorite_service import start_favorite_migration, reconcile_favorite_counts
+    background_jobs.register('favorites migration', start_favorite_migration)
+
+    # 商品收藏数：定期按收藏记录重算，修正增量计数的漂移
+    background_jobs.register_periodic('favorite counts reconciler', reconcile_favorite_counts,
+                                      app.config.get('FAVORITE_COUNTS_RECONCILE_SECONDS', 3600))
+
+    # 分类统计物化视图：启动时全量校对一次，之后定期校对
+    from .services.category_stats import reconcile_category_stats
+    background_jobs.register_periodic('category stats reconciler', reconcile_category_stats,
+                                      app.config.get('CATEGORY_STATS_RECONCILE_SECONDS', 600))
+
+    # 推荐表：定期根据全部浏览和收藏记录重新计算
+    from .services.recommender import recommender
+    recommender.init_app(app)
+    background_jobs.register_periodic('recommendation refresh', recommender.rebuild, recommender.refresh_seconds)
+
+    # 管理后台统计：日统计定期校对
+    from .services.admin_stats import admin_stats, reconcile_daily_stats
+    admin_stats.init_app(app)
+    background_jobs.register_periodic('daily stats reconciler', reconcile_daily_stats, admin_stats.reconcile_seconds)
+
+    background_jobs.init_app(app, redis_client, enabled=background_jobs_enabled)
+
+    # 初始化商品搜索索引（首次检索时从数据库加载）
+    from .services.search_service import search_index
+    search_index.init_app(app)
+
+    # 初始化浏览量写回缓冲（后台线程定期批量写入）
+    from .services.view_counter import view_counter
+    view_counter.init_app(app, redis_client)
+
+    # 初始化公共 GET 接口的响应缓存
+    from .services.response_cache import response_cache
+    response_cache.init_app(app, redis_client)
+
+    # 初始化用户身份缓存（JWT 载荷和用户基本信息）
+    from .services.user_cache import user_cache
+    user_cache.init_app(app)
+
+    # 用户统计面板的短时缓存
+    from .services.user_stats import user_stats_cache
+    user_stats_cache.init_app(app)
+
     # 注册蓝图和路由
     # 需要在这里导入并注册你的蓝图（例如用户、商品、聊天等模块）
     from .routes.user_routes import user_bp # 导入用户蓝图
@@ -72,9 +143,23 @@ def create_app(config_class=Config):
     from . import socket_handlers # 导入 SocketIO 事件处理函数
     socket_handlers.register_handlers(socketio)
 
+    # 集群模式下在线状态保存在 Redis 中，由心跳任务续期
+    from .services.session_registry import session_registry
+    session_registry.init_app(app, redis_client, socketio)
+
+    # 实时消息写入管道（async 模式下启动后台批量写入任务）
+    from .services.message_writer import message_writer
+    message_writer.init_app(app, socketio)
+
+    # “正在输入”通知限流，后台任务负责推送 stopped_typing
+    from .services.typing_throttle import typing_throttle
+    typing_throttle.init_app(app, socketio)
+
     print(f"Flask App is running in {'DEBUG' if app.debug else 'PRODUCTION'} mode.")
     print(f"MongoDB URI: {app.config['MONGODB_SETTINGS']['host']}")
     print(f"Redis URL: {app.config['REDIS_URL']}")
     print(f"SocketIO async mode: {socketio.async_mode}")
+    print(f"SocketIO message queue: {message_queue or 'disabled (single process)'}")
+    print(f"Chat message writes: {app.config.get('MESSAGE_WRITE_MODE', 'sync')}")
 
     return app 
\ No newline at end of file
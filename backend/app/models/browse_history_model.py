@@ -0,0 +1,23 @@
+from .. import db
+import datetime
+
+# 浏览记录保留天数，过期后由 MongoDB 的 TTL 索引自动删除
+HISTORY_TTL_DAYS = 90
+
+class BrowseHistory(db.Document):
+    """浏览记录，每个 (用户, 商品) 一条，重复浏览只更新浏览时间"""
+    user = db.ReferenceField('User', required=True)
+    item = db.ReferenceField('Item', required=True)
+    viewed_at = db.DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {
+        'collection': 'browse_history',
+        'indexes': [
+            {'fields': ('user', 'item'), 'unique': True},
+            ('user', '-viewed_at'),  # 按时间倒序读取最近的浏览记录
+            {'fields': ['viewed_at'], 'expireAfterSeconds': HISTORY_TTL_DAYS * 24 * 3600}
+        ]
+    }
+
+    def __repr__(self):
+        return f'<BrowseHistory {self.user.id} viewed {self.item.id}>'
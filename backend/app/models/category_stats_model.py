@@ -0,0 +1,21 @@
+from .. import db
+import datetime
+
+class CategoryStats(db.Document):
+    """分类统计的物化视图，每个 (分类, 状态) 一条，随商品增删改增量更新并定期全量校对"""
+    category = db.StringField(required=True)
+    status = db.StringField(required=True)
+    count = db.IntField(default=0)  # 商品数量
+    price_sum = db.FloatField(default=0.0)  # 价格总和，用于计算平均价格
+    views = db.IntField(default=0)  # 浏览量总和
+    updated_at = db.DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {
+        'collection': 'category_stats',
+        'indexes': [
+            {'fields': ('category', 'status'), 'unique': True}
+        ]
+    }
+
+    def __repr__(self):
+        return f'<CategoryStats {self.category}/{self.status}: {self.count}>'
@@ -2,6 +2,7 @@ from mongoengine import Document, StringField, ReferenceField, DateTimeField, Bo
 from datetime import datetime
 from .user_model import User
 from .item_model import Item
+from ..utils.fast_json import isoformat
 
 class Comment(Document):
     """评论模型"""
@@ -33,6 +34,6 @@ class Comment(Document):
             'product_id': self.product_id,
             'content': self.content,
             'parent_id': self.parent_id,
-            'created_at': self.created_at.isoformat(),
+            'created_at': isoformat(self.created_at),
             'is_deleted': self.is_deleted
         } 
\ No newline at end of file
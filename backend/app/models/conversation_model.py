@@ -0,0 +1,21 @@
+from .. import db
+import datetime
+
+class Conversation(db.Document):
+    """会话摘要，每个用户与每个联系人各一条，随消息发送和已读实时更新"""
+    owner = db.ReferenceField('User', required=True)  # 会话所属用户
+    peer = db.ReferenceField('User', required=True)  # 联系人
+    last_message = db.StringField()  # 最后一条消息内容
+    last_timestamp = db.DateTimeField(default=datetime.datetime.utcnow)  # 最后一条消息时间
+    unread_count = db.IntField(default=0)  # owner 收到但未读的消息数
+
+    meta = {
+        'collection': 'conversations',
+        'indexes': [
+            {'fields': ('owner', 'peer'), 'unique': True},
+            ('owner', '-last_timestamp')  # 联系人列表按最后消息时间排序
+        ]
+    }
+
+    def __repr__(self):
+        return f'<Conversation {self.owner.id} with {self.peer.id}>'
@@ -0,0 +1,18 @@
+from .. import db
+
+class DailyStats(db.Document):
+    """按天汇总的新增数量（UTC 日期），用于管理后台的近 N 天统计和趋势图"""
+    metric = db.StringField(required=True)  # users、items 或 comments
+    day = db.StringField(required=True)  # YYYY-MM-DD
+    count = db.IntField(default=0)
+
+    meta = {
+        'collection': 'daily_stats',
+        'indexes': [
+            {'fields': ('metric', 'day'), 'unique': True},
+            'day'
+        ]
+    }
+
+    def __repr__(self):
+        return f'<DailyStats {self.metric} {self.day}: {self.count}>'
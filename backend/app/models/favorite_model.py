@@ -0,0 +1,20 @@
+from .. import db
+import datetime
+
+class Favorite(db.Document):
+    """收藏记录，每个 (用户, 商品) 一条，由唯一索引保证不重复收藏"""
+    user = db.ReferenceField('User', required=True)
+    item = db.ReferenceField('Item', required=True)
+    added_at = db.DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {
+        'collection': 'favorites',
+        'indexes': [
+            {'fields': ('user', 'item'), 'unique': True},
+            ('user', '-added_at'),  # 按收藏时间倒序读取收藏列表
+            'item'                  # 商品删除时清理收藏、按商品重算收藏数
+        ]
+    }
+
+    def __repr__(self):
+        return f'<Favorite {self.user.id} likes {self.item.id}>'
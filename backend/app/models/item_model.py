@@ -17,16 +17,26 @@ class Item(db.Document):
         'available', 'reserved', 'sold'
     ])
     views = db.IntField(default=0)  # 浏览次数
+    favorites_count = db.IntField(default=0)  # 收藏次数，由收藏记录同步维护
     
     meta = {
         'collection': 'items',
+        # 复合索引按 ESR 顺序（等值字段、排序字段、范围字段）声明，与 get_items 的各排序方式一一对应：
+        # status/category 为等值条件，created_at/price/views/favorites_count + _id 为排序键，price 为范围条件
         'indexes': [
-            'title', 
-            'category', 
-            'seller', 
-            'status',
-            'created_at'
+            ('status', '-created_at', '-id', 'price'),
+            ('status', 'category', '-created_at', '-id', 'price'),
+            ('status', 'price', 'id'),
+            ('status', 'category', 'price', 'id'),
+            ('status', '-views', '-id', 'price'),
+            ('status', 'category', '-views', '-id', 'price'),
+            ('status', '-favorites_count', '-id', 'price'),
+            ('status', 'category', '-favorites_count', '-id', 'price'),
+            ('seller', '-created_at', '-id'),  # 卖家的商品列表
+            ('-created_at', '-id')             # 管理后台商品列表
         ],
+        # 索引由启动时的后台任务创建和校对，避免首次查询时阻塞
+        'auto_create_index': False,
         'ordering': ['-created_at']  # 默认按创建时间倒序排列
     }
     
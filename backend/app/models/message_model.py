@@ -9,20 +9,36 @@ class Message(db.Document):
     timestamp = db.DateTimeField(default=datetime.datetime.utcnow)  # 发送时间
     read = db.BooleanField(default=False)  # 消息是否已读
     item = db.ReferenceField('Item', required=False)  # 相关联的商品（可选）
+    conversation_id = db.StringField()  # 会话键：双方用户ID排序后拼接，保存时自动生成
     
     meta = {
         'collection': 'messages',
         'indexes': [
-            ('sender', 'receiver', 'timestamp'),  # 联合索引，用于查询两个用户之间的对话
+            ('conversation_id', '-timestamp', '-id'),  # 按时间倒序分页查询两个用户之间的对话
+            ('sender', '-timestamp'),  # 按发送者重建会话摘要
+            ('receiver', 'read'),  # 未读消息统计，以及按接收者重建会话摘要
             'timestamp'
         ],
         'ordering': ['timestamp']  # 默认按时间正序排列
     }
     
+    @staticmethod
+    def conversation_key(user_a, user_b):
+        """生成两个用户之间的会话键，与顺序无关"""
+        return '_'.join(sorted((str(user_a), str(user_b))))
+    
+    def clean(self):
+        """保存前根据发送者和接收者生成会话键"""
+        if not self.conversation_id:
+            sender, receiver = self._data.get('sender'), self._data.get('receiver')
+            if sender is not None and receiver is not None:
+                # 引用可能是文档、DBRef 或 ObjectId
+                self.conversation_id = self.conversation_key(getattr(sender, 'id', sender), getattr(receiver, 'id', receiver))
+    
     def mark_as_read(self):
         """将消息标记为已读"""
         self.read = True
         self.save()
         
     def __repr__(self):
-        return f'<Message from {self.sender.username} to {self.receiver.username}>' 
\ No newline at end of file
+        return f'<Message from {self.sender.username} to {self.receiver.username}>'
@@ -0,0 +1,14 @@
+from .. import db
+import datetime
+
+class MigrationState(db.Document):
+    """数据迁移的完成标记，迁移完成前相关接口使用兼容的查询方式"""
+    name = db.StringField(required=True, unique=True)
+    completed_at = db.DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {
+        'collection': 'migration_state'
+    }
+
+    def __repr__(self):
+        return f'<MigrationState {self.name}>'
@@ -0,0 +1,20 @@
+from .. import db
+import datetime
+
+class Recommendation(db.Document):
+    """预计算的个性化推荐，每个用户一条；items 中只保存可购买且不是该用户发布的商品，
+    并冗余了展示所需的字段，接口一次读取即可返回"""
+    user = db.ReferenceField('User', required=True)
+    items = db.ListField(db.DictField(), default=list)  # [{item, score, title, price, category, image}]，按分数降序
+    updated_at = db.DateTimeField(default=datetime.datetime.utcnow)
+
+    meta = {
+        'collection': 'recommendations',
+        'indexes': [
+            {'fields': ['user'], 'unique': True},
+            'items.item'  # 商品下架或删除时从推荐表中移除
+        ]
+    }
+
+    def __repr__(self):
+        return f'<Recommendation for {self.user.id}: {len(self.items)} items>'
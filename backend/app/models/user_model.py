@@ -10,9 +10,9 @@ class User(db.Document):
     created_at = db.DateTimeField(default=datetime.datetime.utcnow)
     # 管理员标识
     is_admin = db.BooleanField(default=False)
-    # 浏览历史
+    # 浏览历史（已迁移到 browse_history 集合，仅保留用于迁移旧数据）
     browse_history = db.ListField(db.DictField(), default=list)
-    # 收藏列表
+    # 收藏列表（已迁移到 favorites 集合，仅保留用于迁移旧数据）
     favorites = db.ListField(db.DictField(), default=list)
     # 头像URL
     avatar_url = db.StringField(default=None)
@@ -28,7 +28,9 @@ class User(db.Document):
 
     meta = {
         'collection': 'users', # 指定在 MongoDB 中的集合名称
-        'indexes': ['username', 'email'] # 为 username 和 email 创建索引以提高查询效率
+        # 为 username 和 email 创建索引以提高查询效率；
+        # created_at 用于管理后台的用户列表和按天汇总新增用户
+        'indexes': ['username', 'email', ('-created_at', '-id')]
     }
 
     def set_password(self, password):
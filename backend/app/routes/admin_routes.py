@@ -5,6 +5,20 @@ from app.models.item_model import Item
 from app.models.message_model import Message
 from app.models.comment_model import Comment
 from app.utils.auth_utils import admin_required
+from app.services.conversation_service import rebuild_conversations
+from app.services.search_service import search_index
+from app.services.category_stats import apply_item_change, item_snapshot
+from app.services.user_stats import user_stats_cache
+from app.services.recommender import recommender
+from app.services.admin_stats import admin_stats
+from app.services.favorite_service import remove_item_favorites, remove_user_favorites
+from app.services.response_cache import response_cache, invalidate_item
+from app.services.session_registry import session_registry
+from app.services.user_cache import user_cache
+from app.services.message_writer import message_writer
+from app.services.typing_throttle import typing_throttle
+from app.utils.pagination import keyset_page, encode_cursor, wants_total
+from app.utils.item_serializer import resolve_sellers, resolve_items, ref_id, to_object_id, UNKNOWN_SELLER
 from datetime import datetime, timedelta
 import json
 
@@ -141,7 +155,7 @@ def get_admin_info():
         'username': user.username,
         'email': user.email,
         'is_admin': user.is_admin,
-        'created_at': user.created_at.isoformat() if user.created_at else None
+        'created_at': user.created_at
     }), 200
 
 # 获取管理员统计信息
@@ -149,29 +163,16 @@ def get_admin_info():
 @jwt_required()
 @admin_required
 def get_dashboard_stats():
-    # 获取用户总数
-    total_users = User.objects.count()
-    
-    # 获取商品总数
-    total_items = Item.objects.count()
-    
-    # 获取评论总数
-    total_comments = Comment.objects.count()
-    
-    # 获取最近7天注册的用户数
-    seven_days_ago = datetime.now() - timedelta(days=7)
-    new_users_count = User.objects(created_at__gte=seven_days_ago).count()
-    
-    # 获取最近7天发布的商品数
-    new_items_count = Item.objects(created_at__gte=seven_days_ago).count()
-    
-    return jsonify({
-        'total_users': total_users,
-        'total_items': total_items,
-        'total_comments': total_comments,
-        'new_users_count': new_users_count,
-        'new_items_count': new_items_count
-    }), 200
+    # 总数为集合元数据中的估算值，近7天新增数来自日统计；结果可能有 ADMIN_STATS_MAX_AGE_SECONDS 秒的延迟
+    return jsonify(admin_stats.dashboard()), 200
+
+# 获取近 30/90 天的新增趋势
+@admin_bp.route('/stats/timeseries', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_stats_timeseries():
+    days = int(request.args.get('days', 30))
+    return jsonify(admin_stats.time_series(days)), 200
 
 # 获取所有用户列表
 @admin_bp.route('/users', methods=['GET'])
@@ -181,6 +182,8 @@ def get_users():
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 10))
     search_query = request.args.get('query', '')
+    after = request.args.get('after', '')  # 游标分页：上一页返回的 next_cursor
+    order = ('-created_at', '-id')
     
     # 构建查询条件
     query = {}
@@ -192,11 +195,21 @@ def get_users():
             ]
         }
     
-    # 计算总数
-    total = User.objects(__raw__=query).count()
-    
-    # 分页查询
-    users = User.objects(__raw__=query).skip((page - 1) * per_page).limit(per_page)
+    users_query = User.objects(__raw__=query)
+    if after:
+        # 游标分页，默认不计算总数
+        try:
+            users, next_cursor = keyset_page(users_query, order, after, per_page)
+        except ValueError as e:
+            return jsonify({'msg': str(e)}), 400
+        total = users_query.count() if wants_total(request.args) else None
+    else:
+        # 计算总数
+        total = users_query.count()
+        
+        # 分页查询
+        users = list(users_query.order_by(*order).skip((page - 1) * per_page).limit(per_page))
+        next_cursor = encode_cursor(users[-1], order) if len(users) == per_page else None
     
     # 格式化用户数据
     user_list = []
@@ -206,7 +219,7 @@ def get_users():
             'username': user.username,
             'email': user.email,
             'is_admin': user.is_admin,
-            'created_at': user.created_at.isoformat() if user.created_at else None,
+            'created_at': user.created_at,
             'avatar_url': user.avatar_url if hasattr(user, 'avatar_url') else None
         })
     
@@ -214,7 +227,8 @@ def get_users():
         'users': user_list,
         'total': total,
         'page': page,
-        'per_page': per_page
+        'per_page': per_page,
+        'next_cursor': next_cursor
     }), 200
 
 # 获取单个用户详情
@@ -232,7 +246,7 @@ def get_user(user_id):
         'username': user.username,
         'email': user.email,
         'is_admin': user.is_admin,
-        'created_at': user.created_at.isoformat() if user.created_at else None,
+        'created_at': user.created_at,
         'avatar_url': user.avatar_url if hasattr(user, 'avatar_url') else None,
         'bio': user.bio if hasattr(user, 'bio') else None
     }), 200
@@ -263,6 +277,7 @@ def update_user(user_id):
         user.set_password(data['password'])
     
     user.save()
+    user_cache.invalidate(user.id)
     
     return jsonify({'msg': '用户信息已更新'}), 200
 
@@ -278,6 +293,8 @@ def delete_user(user_id):
     
     # 删除用户
     user.delete()
+    remove_user_favorites(user.id)
+    user_cache.invalidate(user.id)
     
     return jsonify({'msg': '用户已删除'}), 200
 
@@ -289,6 +306,8 @@ def get_items():
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 10))
     search_query = request.args.get('query', '')
+    after = request.args.get('after', '')  # 游标分页：上一页返回的 next_cursor
+    order = ('-created_at', '-id')
     
     # 构建查询条件
     query = {}
@@ -300,21 +319,27 @@ def get_items():
             ]
         }
     
-    # 计算总数
-    total = Item.objects(__raw__=query).count()
-    
-    # 分页查询
-    items = Item.objects(__raw__=query).skip((page - 1) * per_page).limit(per_page)
+    items_query = Item.objects(__raw__=query)
+    if after:
+        # 游标分页，默认不计算总数
+        try:
+            items, next_cursor = keyset_page(items_query, order, after, per_page)
+        except ValueError as e:
+            return jsonify({'msg': str(e)}), 400
+        total = items_query.count() if wants_total(request.args) else None
+    else:
+        # 计算总数
+        total = items_query.count()
+        
+        # 分页查询
+        items = list(items_query.order_by(*order).skip((page - 1) * per_page).limit(per_page))
+        next_cursor = encode_cursor(items[-1], order) if len(items) == per_page else None
     
-    # 格式化商品数据
+    # 格式化商品数据，卖家信息批量查询
+    sellers = resolve_sellers(items)
     item_list = []
     for item in items:
-        # 获取卖家信息
-        seller = User.objects(id=item.seller_id).first()
-        seller_info = {
-            'id': str(seller.id),
-            'username': seller.username
-        } if seller else {'id': 'unknown', 'username': 'Unknown'}
+        seller_info = sellers.get(ref_id(item._data.get('seller')), UNKNOWN_SELLER)
         
         item_list.append({
             'id': str(item.id),
@@ -324,14 +349,15 @@ def get_items():
             'description': item.description,
             'images': item.images if hasattr(item, 'images') else [],
             'seller': seller_info,
-            'created_at': item.created_at.isoformat() if item.created_at else None
+            'created_at': item.created_at
         })
     
     return jsonify({
         'items': item_list,
         'total': total,
         'page': page,
-        'per_page': per_page
+        'per_page': per_page,
+        'next_cursor': next_cursor
     }), 200
 
 # 获取单个商品详情
@@ -345,11 +371,7 @@ def get_item(item_id):
         return jsonify({'msg': '商品不存在'}), 404
     
     # 获取卖家信息
-    seller = User.objects(id=item.seller_id).first()
-    seller_info = {
-        'id': str(seller.id),
-        'username': seller.username
-    } if seller else {'id': 'unknown', 'username': 'Unknown'}
+    seller_info = resolve_sellers([item]).get(ref_id(item._data.get('seller')), UNKNOWN_SELLER)
     
     return jsonify({
         'id': str(item.id),
@@ -359,7 +381,7 @@ def get_item(item_id):
         'description': item.description,
         'images': item.images if hasattr(item, 'images') else [],
         'seller': seller_info,
-        'created_at': item.created_at.isoformat() if item.created_at else None
+        'created_at': item.created_at
     }), 200
 
 # 更新商品信息
@@ -373,6 +395,8 @@ def update_item(item_id):
         return jsonify({'msg': '商品不存在'}), 404
     
     data = request.get_json()
+    old_category = item.category
+    before = item_snapshot(item)
     
     # 更新商品信息
     if 'title' in data:
@@ -388,6 +412,11 @@ def update_item(item_id):
         item.description = data['description']
     
     item.save()
+    search_index.add_item(item)
+    apply_item_change(before, item_snapshot(item))
+    user_stats_cache.invalidate(ref_id(item._data.get('seller')))
+    recommender.refresh_item(item)
+    invalidate_item(item.id, old_category, item.category)
     
     return jsonify({'msg': '商品信息已更新'}), 200
 
@@ -403,9 +432,41 @@ def delete_item(item_id):
     
     # 删除商品
     item.delete()
+    search_index.remove_item(item_id)
+    apply_item_change(item_snapshot(item), None)
+    user_stats_cache.invalidate(ref_id(item._data.get('seller')))
+    recommender.discard_item(item_id)
+    remove_item_favorites(item_id)
+    invalidate_item(item_id, item.category)
     
     return jsonify({'msg': '商品已删除'}), 200
 
+# 获取响应缓存统计
+@admin_bp.route('/cache/stats', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_cache_stats():
+    stats = response_cache.stats()
+    stats['user_cache'] = user_cache.stats()
+    return jsonify(stats), 200
+
+# 立即重建推荐表
+@admin_bp.route('/recommendations/rebuild', methods=['POST'])
+@jwt_required()
+@admin_required
+def rebuild_recommendations():
+    return jsonify(recommender.rebuild()), 200
+
+# 获取实时连接统计
+@admin_bp.route('/sockets/stats', methods=['GET'])
+@jwt_required()
+@admin_required
+def get_socket_stats():
+    stats = session_registry.metrics()
+    stats['message_writer'] = message_writer.stats()
+    stats['typing'] = typing_throttle.stats()
+    return jsonify(stats), 200
+
 # 获取系统日志
 @admin_bp.route('/logs', methods=['GET'])
 @jwt_required()
@@ -416,9 +477,9 @@ def get_logs():
     
     # 模拟日志数据
     logs = [
-        {'timestamp': datetime.now().isoformat(), 'level': 'INFO', 'message': '系统正常运行'},
-        {'timestamp': (datetime.now() - timedelta(hours=1)).isoformat(), 'level': 'WARNING', 'message': '用户登录失败次数过多'},
-        {'timestamp': (datetime.now() - timedelta(hours=2)).isoformat(), 'level': 'ERROR', 'message': '数据库连接异常'}
+        {'timestamp': datetime.utcnow(), 'level': 'INFO', 'message': '系统正常运行'},
+        {'timestamp': datetime.utcnow() - timedelta(hours=1), 'level': 'WARNING', 'message': '用户登录失败次数过多'},
+        {'timestamp': datetime.utcnow() - timedelta(hours=2), 'level': 'ERROR', 'message': '数据库连接异常'}
     ]
     
     return jsonify({'logs': logs}), 200
@@ -435,6 +496,8 @@ def get_all_messages():
     page = int(request.args.get('page', 1))
     limit = int(request.args.get('limit', 10))
     skip = (page - 1) * limit
+    after = request.args.get('after', '')  # 游标分页：上一页返回的 next_cursor
+    order = ('-timestamp', '-id')
     
     # 过滤参数
     query = request.args.get('query', '')
@@ -447,11 +510,21 @@ def get_all_messages():
     
     # 执行查询
     try:
-        # 计算总数
-        total_count = Message.objects(**filter_conditions).count()
+        messages_query = Message.objects(**filter_conditions).no_dereference()
+        if after:
+            # 游标分页，默认不计算总数
+            message_objects, next_cursor = keyset_page(messages_query, order, after, limit)
+            total_count = messages_query.count() if wants_total(request.args) else None
+        else:
+            # 计算总数
+            total_count = messages_query.count()
+            
+            # 获取分页数据
+            message_objects = list(messages_query.order_by(*order).skip(skip).limit(limit))
+            next_cursor = encode_cursor(message_objects[-1], order) if len(message_objects) == limit else None
         
-        # 获取分页数据
-        message_objects = Message.objects(**filter_conditions).order_by('-timestamp').skip(skip).limit(limit)
+        # 批量获取关联商品的标题，发送者和接收者使用身份缓存
+        items = resolve_items([msg._data.get('item') for msg in message_objects])
         
         # 格式化消息数据
         messages = []
@@ -459,34 +532,37 @@ def get_all_messages():
             # 如果提供了搜索关键词，且关键词不在消息内容中，则跳过
             if query and query.lower() not in msg.content.lower():
                 continue
-                
+            
+            sender = user_cache.get(ref_id(msg._data.get('sender')))
+            receiver = user_cache.get(ref_id(msg._data.get('receiver')))
             message_data = {
                 'id': str(msg.id),
-                'senderId': str(msg.sender.id),
-                'senderName': msg.sender.username,
-                'senderAvatar': msg.sender.avatar_url if hasattr(msg.sender, 'avatar_url') else None,
-                'receiverId': str(msg.receiver.id),
-                'receiverName': msg.receiver.username,
-                'receiverAvatar': msg.receiver.avatar_url if hasattr(msg.receiver, 'avatar_url') else None,
+                'senderId': str(ref_id(msg._data.get('sender'))),
+                'senderName': sender.username if sender else None,
+                'senderAvatar': sender.avatar_url if sender else None,
+                'receiverId': str(ref_id(msg._data.get('receiver'))),
+                'receiverName': receiver.username if receiver else None,
+                'receiverAvatar': receiver.avatar_url if receiver else None,
                 'content': msg.content,
-                'timestamp': msg.timestamp.isoformat(),
+                'timestamp': msg.timestamp,
                 'read': msg.read
             }
             
             # 如果消息关联了商品，添加商品信息
-            if msg.item:
-                message_data['item'] = {
-                    'id': str(msg.item.id),
-                    'title': msg.item.title
-                }
+            item = items.get(ref_id(msg._data.get('item')))
+            if item:
+                message_data['item'] = item
                 
             messages.append(message_data)
         
         return jsonify({
             'messages': messages,
-            'total': total_count
+            'total': total_count,
+            'next_cursor': next_cursor
         }), 200
         
+    except ValueError as e:
+        return jsonify({'msg': str(e)}), 400
     except Exception as e:
         current_app.logger.error(f'获取消息列表出错: {str(e)}')
         return jsonify({'msg': '获取消息列表失败', 'error': str(e)}), 500
@@ -516,7 +592,7 @@ def get_message(message_id):
             'receiverName': message.receiver.username,
             'receiverAvatar': message.receiver.avatar_url if hasattr(message.receiver, 'avatar_url') else None,
             'content': message.content,
-            'timestamp': message.timestamp.isoformat(),
+            'timestamp': message.timestamp,
             'read': message.read
         }
         
@@ -573,8 +649,11 @@ def delete_message(message_id):
         if not message:
             return jsonify({'msg': '消息不存在'}), 404
             
-        # 删除消息
+        # 删除消息，并重建双方的会话摘要
+        participants = {message.sender.id, message.receiver.id}
         message.delete()
+        for user_id in participants:
+            rebuild_conversations(user_id)
             
         return jsonify({'msg': '消息已删除'}), 200
         
@@ -603,11 +682,17 @@ def batch_delete_messages():
     try:
         # 删除消息
         deleted_count = 0
+        participants = set()
         for message_id in message_ids:
             message = Message.objects(id=message_id).first()
             if message:
+                participants.update((message.sender.id, message.receiver.id))
                 message.delete()
                 deleted_count += 1
+        
+        # 重建受影响用户的会话摘要
+        for user_id in participants:
+            rebuild_conversations(user_id)
             
         return jsonify({
             'msg': f'成功删除{deleted_count}条消息',
@@ -634,17 +719,15 @@ def get_all_comments():
     # 获取评论总数
     total_comments = Comment.objects().count()
 
+    # 批量获取评论对应的商品标题
+    comments = list(comments)
+    products = resolve_items([comment.product_id for comment in comments])
+
     # 构建返回数据
     comments_data = []
     for comment in comments:
-        # 获取商品信息
-        product_title = "商品已删除"
-        try:
-            product = Item.objects(id=comment.product_id).first()
-            if product:
-                product_title = product.title
-        except:
-            pass
+        product = products.get(to_object_id(comment.product_id))
+        product_title = product['title'] if product else "商品已删除"
 
         comment_dict = comment.to_mongo()
         comment_dict['_id'] = str(comment_dict['_id'])
@@ -672,5 +755,6 @@ def admin_delete_comment(comment_id):
 
     # 直接删除评论（管理员可以物理删除）
     comment.delete()
+    response_cache.invalidate(f"comments:{comment.product_id}")
 
     return jsonify({'msg': '评论已删除'}), 200 
\ No newline at end of file
@@ -1,67 +1,82 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models.item_model import Item
-from ..models.user_model import User
+from ..models.category_stats_model import CategoryStats
+from ..services.response_cache import response_cache
+from ..services.user_cache import user_cache
+from ..services.user_stats import user_stats_cache
+from ..services.recommender import recommender
 import json
 
 analytics_bp = Blueprint('analytics_bp', __name__)
 
 @analytics_bp.route('/popular-categories', methods=['GET'])
+@response_cache.cached('popular_categories', tags=lambda kwargs, args: ['category_stats'])
 def get_popular_categories():
-    """统计商品分类数量"""
+    """统计商品分类数量，读取物化的分类统计集合，不再扫描商品集合"""
     try:
-        # 使用MongoDB聚合$group统计商品分类数量
-        pipeline = [
-            {
-                '$group': {
-                    '_id': '$category',
-                    'count': {'$sum': 1}
-                }
-            },
-            {
-                '$sort': {'count': -1}  # 按数量降序排序
-            }
-        ]
-        
-        results = list(Item.objects.aggregate(pipeline))
-        
-        # 格式化结果
-        categories = []
-        for result in results:
-            categories.append({
-                "category": result['_id'],
-                "count": result['count']
+        categories = {}
+        for row in CategoryStats.objects.only('category', 'status', 'count', 'price_sum', 'views').as_pymongo():
+            # 跳过计数为 0 的条目（该分类和状态下已没有商品）
+            if not row.get('count'):
+                continue
+            entry = categories.setdefault(row['category'], {
+                "category": row['category'],
+                "count": 0,
+                "by_status": {},
+                "price_sum": 0.0,
+                "views": 0
             })
+            entry["count"] += row['count']
+            entry["by_status"][row['status']] = row['count']
+            entry["price_sum"] += row.get('price_sum', 0.0)
+            entry["views"] += row.get('views', 0)
+        
+        # 格式化结果，按数量降序排序
+        result = []
+        for entry in sorted(categories.values(), key=lambda e: e["count"], reverse=True):
+            price_sum = entry.pop("price_sum")
+            entry["available"] = entry["by_status"].get('available', 0)
+            entry["avg_price"] = round(price_sum / entry["count"], 2)
+            result.append(entry)
         
         return jsonify({
-            "categories": categories
+            "categories": result
         }), 200
     except Exception as e:
         print(f"Error getting popular categories: {e}")
         return jsonify({"msg": "An internal error occurred"}), 500
 
-# 假设有一个浏览记录模型或在用户模型中存储浏览历史
 @analytics_bp.route('/browse-not-bought', methods=['GET'])
 @jwt_required()
 def get_browse_not_bought():
-    """返回当前用户浏览过但未购买的商品"""
+    """根据浏览和收藏记录推荐商品：读取预计算的推荐表，没有推荐结果时返回热门商品"""
     current_user_id = get_jwt_identity()
+    limit = min(int(request.args.get('limit', 5)), recommender.top_k)
     
     # 检查当前用户是否存在
-    current_user = User.objects(id=current_user_id).first()
+    current_user = user_cache.get(current_user_id)
     if not current_user:
         return jsonify({"msg": "User not found"}), 404
     
     try:
-        # 这里假设我们有另一个集合来存储用户浏览记录
-        # 由于我们没有实际的浏览记录模型，这里用一个模拟数据来演示
-        # 实际实现中，你需要创建一个浏览记录模型，并基于该模型查询数据
+        candidates = recommender.recommend(current_user.id, limit)
+        if candidates:
+            result = [{
+                "id": str(entry['item']),
+                "title": entry.get('title'),
+                "price": entry.get('price'),
+                "category": entry.get('category'),
+                "image": entry.get('image'),
+                "score": entry.get('score')
+            } for entry in candidates]
+            return jsonify({
+                "recommended_items": result,
+                "source": "personalized"
+            }), 200
         
-        # 模拟数据 - 这里简单地返回一些用户可能感兴趣的商品
-        # 实际实现应该查询数据库中的浏览记录
-        
-        # 查询用户未发布的商品（模拟浏览过的商品）
-        items = Item.objects(seller__ne=current_user).limit(5)
+        # 新用户或行为太少：按浏览量返回可购买的热门商品
+        items = Item.objects(status='available', seller__ne=current_user.id).order_by('-views', '-id').limit(limit)
         
         result = []
         for item in items:
@@ -74,7 +89,8 @@ def get_browse_not_bought():
             })
         
         return jsonify({
-            "recommended_items": result
+            "recommended_items": result,
+            "source": "popular"
         }), 200
     except Exception as e:
         print(f"Error getting browse-not-bought recommendations: {e}")
@@ -83,54 +99,15 @@ def get_browse_not_bought():
 @analytics_bp.route('/user-stats', methods=['GET'])
 @jwt_required()
 def get_user_stats():
-    """获取当前用户的统计信息"""
+    """获取当前用户的统计信息（带短时缓存）"""
     current_user_id = get_jwt_identity()
     
-    # 检查当前用户是否存在
-    current_user = User.objects(id=current_user_id).first()
-    if not current_user:
-        return jsonify({"msg": "User not found"}), 404
-    
     try:
-        # 统计用户发布的商品数量
-        items_count = Item.objects(seller=current_user).count()
-        
-        # 统计用户发布的商品按状态分组
-        pipeline = [
-            {
-                '$match': {'seller': current_user.id}
-            },
-            {
-                '$group': {
-                    '_id': '$status',
-                    'count': {'$sum': 1}
-                }
-            }
-        ]
-        
-        status_counts = {}
-        for result in Item.objects.aggregate(pipeline):
-            status_counts[result['_id']] = result['count']
-        
-        # 获取总浏览量
-        total_views = Item.objects(seller=current_user).sum('views')
+        stats = user_stats_cache.get(current_user_id)
+        if stats is None:
+            return jsonify({"msg": "User not found"}), 404
         
-        # 获取收藏数量
-        favorites_count = 0
-        if hasattr(current_user, 'favorites') and current_user.favorites:
-            favorites_count = len(current_user.favorites)
-        
-        return jsonify({
-            "user": {
-                "id": str(current_user.id),
-                "username": current_user.username,
-                "joined_at": current_user.created_at.isoformat()
-            },
-            "items_count": items_count,
-            "status_counts": status_counts,
-            "total_views": total_views,
-            "favorites_count": favorites_count
-        }), 200
+        return jsonify(stats), 200
     except Exception as e:
         print(f"Error getting user stats: {e}")
         return jsonify({"msg": "An internal error occurred"}), 500 
\ No newline at end of file
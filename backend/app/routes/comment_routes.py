@@ -1,55 +1,64 @@
 from flask import Blueprint, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models.comment import Comment
-from app.models.user_model import User
+from app.services.user_cache import user_cache
+from app.services.response_cache import response_cache
+from app.services.admin_stats import record_created
+from app.utils.pagination import keyset_page, encode_cursor, wants_total
 from bson import ObjectId
 
 comment_bp = Blueprint('comment', __name__)
 
 @comment_bp.route('/products/<product_id>/comments', methods=['GET'])
+@response_cache.cached('comments', tags=lambda kwargs, args: [f"comments:{kwargs['product_id']}"])
 def get_comments(product_id):
     """获取商品评论列表"""
     page = int(request.args.get('page', 1))
     per_page = int(request.args.get('per_page', 10))
+    after = request.args.get('after', '')  # 游标分页：上一页返回的 next_cursor
     skip = (page - 1) * per_page
-
-    # 获取主评论（没有parent_id的评论）
-    parent_comments = Comment.objects(
-        product_id=product_id,
-        parent_id=None
-    ).order_by('-created_at').skip(skip).limit(per_page)
+    order = ('-created_at', '-id')
+
+    # 获取主评论（没有parent_id的评论），直接返回原始文档，ObjectId 和时间由应用的 JSON 编码器处理
+    top_level = Comment.objects(product_id=product_id, parent_id=None)
+    if after:
+        try:
+            parent_comments, next_cursor = keyset_page(top_level.as_pymongo(), order, after, per_page)
+        except ValueError as e:
+            return jsonify({'msg': str(e)}), 400
+    else:
+        parent_comments = list(top_level.order_by(*order).skip(skip).limit(per_page).as_pymongo())
+        next_cursor = encode_cursor(parent_comments[-1], order) if len(parent_comments) == per_page else None
 
     # 获取这些主评论的所有回复
-    parent_ids = [str(comment.id) for comment in parent_comments]
-    replies = Comment.objects(product_id=product_id, parent_id__in=parent_ids)
+    parent_ids = [str(comment['_id']) for comment in parent_comments]
+    replies = Comment.objects(product_id=product_id, parent_id__in=parent_ids).as_pymongo()
     
     # 将回复按父评论ID分组
     replies_dict = {}
     for reply in replies:
-        if reply.parent_id not in replies_dict:
-            replies_dict[reply.parent_id] = []
-        replies_dict[reply.parent_id].append(reply.to_mongo())
+        replies_dict.setdefault(reply['parent_id'], []).append(reply)
 
     # 构建返回数据
     comments_data = []
     for comment in parent_comments:
-        comment_dict = comment.to_mongo()
-        comment_dict['replies'] = [
-            {**reply, '_id': str(reply['_id'])}
-            for reply in replies_dict.get(str(comment.id), [])
-        ]
-        comment_dict['_id'] = str(comment_dict['_id'])
-        comments_data.append(comment_dict)
+        comment['replies'] = replies_dict.get(str(comment['_id']), [])
+        comments_data.append(comment)
 
-    # 获取评论总数（主评论）
-    total_comments = Comment.objects(product_id=product_id, parent_id=None).count()
+    # 获取评论总数（主评论），游标分页时仅在 include_total=true 时计算
+    total_comments = None
+    total_pages = None
+    if not after or wants_total(request.args):
+        total_comments = top_level.count()
+        total_pages = (total_comments + per_page - 1) // per_page
 
     return jsonify({
         'comments': comments_data,
         'total': total_comments,
         'page': page,
         'per_page': per_page,
-        'total_pages': (total_comments + per_page - 1) // per_page
+        'total_pages': total_pages,
+        'next_cursor': next_cursor
     })
 
 @comment_bp.route('/products/<product_id>/comments', methods=['POST'])
@@ -63,7 +72,7 @@ def create_comment(product_id):
         return jsonify({'msg': '评论内容不能为空'}), 400
 
     # 获取用户信息
-    user = User.objects(id=user_id).first()
+    user = user_cache.get(user_id)
     if not user:
         return jsonify({'msg': '用户不存在'}), 404
 
@@ -72,11 +81,13 @@ def create_comment(product_id):
         product_id=product_id,
         user_id=str(user.id),
         username=user.username,
-        avatar=user.avatar if hasattr(user, 'avatar') else None,
+        avatar=user.avatar_url,
         content=data['content'],
         parent_id=data.get('parent_id')  # 如果是回复评论，则包含父评论ID
     )
     comment.save()
+    record_created('comments', comment.created_at)
+    response_cache.invalidate(f"comments:{product_id}")
 
     return jsonify({
         'msg': '评论成功',
@@ -85,7 +96,7 @@ def create_comment(product_id):
             'content': comment.content,
             'username': comment.username,
             'avatar': comment.avatar,
-            'created_at': comment.created_at.isoformat(),
+            'created_at': comment.created_at,
             'parent_id': comment.parent_id
         }
     }), 201
@@ -109,5 +120,6 @@ def delete_comment(comment_id):
     comment.is_deleted = True
     comment.content = "该评论已被用户删除"
     comment.save()
+    response_cache.invalidate(f"comments:{comment.product_id}")
 
     return jsonify({'msg': '评论已删除'}), 200 
\ No newline at end of file
@@ -1,13 +1,24 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models.item_model import Item
-from ..models.user_model import User
+from ..services.search_service import search_index
+from ..services.view_counter import view_counter
+from ..services.response_cache import response_cache, invalidate_item
+from ..services.user_cache import user_cache
+from ..services.category_stats import apply_item_change, item_snapshot
+from ..services.user_stats import user_stats_cache
+from ..services.recommender import recommender
+from ..services.admin_stats import record_created
+from ..services.favorite_service import remove_item_favorites
+from ..utils.pagination import keyset_page, encode_cursor, wants_total, InvalidCursor
+from ..utils.item_serializer import item_view, project_items, serialize_item_docs, ref_id, InvalidView
 from mongoengine.errors import ValidationError, DoesNotExist
 import datetime
 import os
 import uuid
 from werkzeug.utils import secure_filename
 import json
+from bson import ObjectId
 
 item_bp = Blueprint('item_bp', __name__)
 
@@ -19,6 +30,16 @@ UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__f
 # 确保上传文件夹存在
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# 列表排序方式对应的排序键，以 _id 作为第二排序键保证游标位置唯一；
+# Item 模型上为每种排序声明了对应的复合索引
+SORT_ORDERS = {
+    'newest': ('-created_at', '-id'),   # 最新发布
+    'price_asc': ('+price', '+id'),     # 价格从低到高
+    'price_desc': ('-price', '-id'),    # 价格从高到低
+    'views': ('-views', '-id'),         # 浏览量
+    'favorites': ('-favorites_count', '-id'),  # 收藏数
+}
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -30,7 +51,9 @@ def create_item():
     try:
         # 获取当前用户
         user_id = get_jwt_identity()
-        user = User.objects.get(id=user_id)
+        user = user_cache.get(user_id)
+        if not user:
+            return jsonify({"msg": "User not found"}), 404
         
         # 获取请求的Content-Type
         content_type = request.headers.get('Content-Type', '')
@@ -73,10 +96,15 @@ def create_item():
                     description=description,
                     price=float(price),
                     category=category,
-                    seller=user,
+                    seller=user.id,
                     images=image_paths
                 )
                 new_item.save()
+                search_index.add_item(new_item)
+                apply_item_change(None, item_snapshot(new_item))
+                record_created('items', new_item.created_at)
+                user_stats_cache.invalidate(user_id)
+                invalidate_item(new_item.id, new_item.category)
                 
                 return jsonify({
                     "msg": "Item created successfully",
@@ -95,6 +123,7 @@ def create_item():
         return jsonify({"msg": "An error occurred while creating the item"}), 500
 
 @item_bp.route('', methods=['GET'])
+@response_cache.cached('items', tags=lambda kwargs, args: [f"category:{args['category']}"] if args.get('category') else ['items:all'])
 def get_items():
     """获取商品列表，支持搜索和筛选"""
     # 获取查询参数
@@ -102,9 +131,10 @@ def get_items():
     category = request.args.get('category', '')
     min_price = request.args.get('min_price', '')
     max_price = request.args.get('max_price', '')
-    sort = request.args.get('sort', 'newest')  # 排序方式: newest, price_asc, price_desc, views
+    sort = request.args.get('sort', 'newest')  # 排序方式: newest, price_asc, price_desc, views, favorites, relevance
     page = int(request.args.get('page', 1))
     limit = int(request.args.get('limit', 12))
+    after = request.args.get('after', '')  # 游标分页：上一页返回的 next_cursor
     exclude_id = request.args.get('excludeId', '')  # 排除特定ID的商品（用于推荐时排除当前商品）
     seller_id = request.args.get('seller_id', '')  # 按卖家ID过滤
     
@@ -113,12 +143,11 @@ def get_items():
     
     # 构建查询条件
     query = {}
+    ranked_ids = None
     if keyword:
-        # 使用正则表达式进行模糊搜索（标题或描述中包含搜索词）
-        query['$or'] = [
-            {'title': {'$regex': keyword, '$options': 'i'}},
-            {'description': {'$regex': keyword, '$options': 'i'}}
-        ]
+        # 使用倒排索引检索标题和描述：同时命中全部查询词的商品ID（按 BM25 得分取前 MAX_SEARCH_RESULTS 个）
+        ranked_ids = [item_id for item_id, _ in search_index.search(keyword)]
+        query['_id'] = {'$in': [ObjectId(item_id) for item_id in ranked_ids]}
     
     if category:
         query['category'] = category
@@ -161,57 +190,52 @@ def get_items():
     
     print(f"最终查询条件: {query}")
     
-    # 确定排序方式
-    if sort == 'newest':
-        sort_field = '-created_at'  # 最新发布
-    elif sort == 'price_asc':
-        sort_field = '+price'  # 价格从低到高
-    elif sort == 'price_desc':
-        sort_field = '-price'  # 价格从高到低
-    elif sort == 'views':
-        sort_field = '-views'  # 浏览量
-    else:
-        sort_field = '-created_at'  # 默认按创建时间排序
+    # 确定排序方式，默认按创建时间排序
+    order = SORT_ORDERS.get(sort, SORT_ORDERS['newest'])
+    next_cursor = None
     
     try:
-        # 执行查询
-        items = Item.objects(__raw__=query).order_by(sort_field)
-        
-        # 获取总数
-        total_count = items.count()
+        # 列表默认使用卡片视图，只加载卡片需要的字段
+        view = item_view(request.args.get('fields'))
         
-        # 分页
-        paginated_items = items.skip((page - 1) * limit).limit(limit)
-        
-        # 格式化结果
-        result = []
-        for item in paginated_items:
-            seller_data = {
-                "id": str(item.seller.id),
-                "username": item.seller.username
-            }
+        if sort == 'relevance' and ranked_ids is not None:
+            # 按相关度排序：先用筛选条件过滤命中的商品ID，再按得分顺序分页
+            matched_ids = {str(doc['_id']) for doc in Item.objects(__raw__=query).only('id').as_pymongo()}
+            ordered_ids = [item_id for item_id in ranked_ids if item_id in matched_ids]
+            total_count = len(ordered_ids)
+            page_ids = ordered_ids[(page - 1) * limit:page * limit]
+            items_by_id = {str(doc['_id']): doc for doc in project_items(Item.objects(id__in=page_ids), view)}
+            paginated_items = [items_by_id[item_id] for item_id in page_ids if item_id in items_by_id]
+        elif after:
+            # 游标分页：按 (排序字段, _id) 定位，翻页深度不影响查询开销，默认不计算总数
+            items = Item.objects(__raw__=query)
+            paginated_items, next_cursor = keyset_page(project_items(items, view), order, after, limit)
+            total_count = items.count() if wants_total(request.args) else None
+        else:
+            # 执行查询
+            items = Item.objects(__raw__=query).order_by(*order)
+            
+            # 获取总数
+            total_count = items.count()
             
-            result.append({
-                "id": str(item.id),
-                "title": item.title,
-                "description": item.description,
-                "price": item.price,
-                "category": item.category,
-                "images": item.images,
-                "seller": seller_data,
-                "created_at": item.created_at.isoformat(),
-                "updated_at": item.updated_at.isoformat(),
-                "status": item.status,
-                "views": item.views
-            })
+            # 分页
+            paginated_items = list(project_items(items, view).skip((page - 1) * limit).limit(limit))
+            if len(paginated_items) == limit:
+                next_cursor = encode_cursor(paginated_items[-1], order)
+        
+        # 格式化结果（卖家信息批量查询）
+        result = serialize_item_docs(paginated_items, view)
         
         # 返回分页信息和结果
         return jsonify({
             "total": total_count,
             "page": page,
             "limit": limit,
+            "next_cursor": next_cursor,
             "items": result
         }), 200
+    except (InvalidView, InvalidCursor) as e:
+        return jsonify({"msg": str(e)}), 400
     except Exception as e:
         print(f"Error fetching items: {e}")
         return jsonify({"msg": "An internal error occurred"}), 500
@@ -219,35 +243,28 @@ def get_items():
 @item_bp.route('/<item_id>', methods=['GET'])
 def get_item(item_id):
     """获取单个商品的详细信息"""
+    response = make_response(_get_item_detail(item_id=item_id))
+    if response.status_code == 200:
+        # 增加浏览次数（写入缓冲，由后台线程批量 $inc），缓存命中时同样计数
+        view_counter.increment(item_id)
+    return response
+
+@response_cache.cached('item', tags=lambda kwargs, args: [f"item:{kwargs['item_id']}"])
+def _get_item_detail(item_id):
+    """查询并格式化商品详情（结果可缓存）"""
     try:
-        item = Item.objects(id=item_id).first()
+        view = item_view(request.args.get('fields'), default='detail')
+        doc = project_items(Item.objects(id=item_id), view).first()
         
-        if not item:
+        if not doc:
             return jsonify({"msg": "Item not found"}), 404
         
-        # 增加浏览次数
-        item.views += 1
-        item.save()
-        
         # 格式化返回结果
-        result = {
-            "id": str(item.id),
-            "title": item.title,
-            "description": item.description,
-            "price": item.price,
-            "category": item.category,
-            "images": item.images,
-            "seller": {
-                "id": str(item.seller.id),
-                "username": item.seller.username
-            },
-            "created_at": item.created_at.isoformat(),
-            "updated_at": item.updated_at.isoformat(),
-            "status": item.status,
-            "views": item.views
-        }
+        result = serialize_item_docs([doc], view)[0]
         
         return jsonify(result), 200
+    except (InvalidView, InvalidCursor) as e:
+        return jsonify({"msg": str(e)}), 400
     except DoesNotExist:
         return jsonify({"msg": "Item not found"}), 404
     except Exception as e:
@@ -261,13 +278,17 @@ def update_item(item_id):
     try:
         # 获取当前用户
         user_id = get_jwt_identity()
-        user = User.objects.get(id=user_id)
+        user = user_cache.get(user_id)
+        if not user:
+            return jsonify({"msg": "User not found"}), 404
         
         # 获取商品
         item = Item.objects.get(id=item_id)
+        old_category = item.category
+        before = item_snapshot(item)
         
         # 检查权限
-        if str(item.seller.id) != user_id and not user.is_admin:
+        if str(ref_id(item._data.get('seller'))) != user_id and not user.is_admin:
             return jsonify({"msg": "Unauthorized"}), 403
             
         # 获取请求的Content-Type
@@ -324,6 +345,11 @@ def update_item(item_id):
             # 更新时间戳
             item.update_timestamp()
             item.save()
+            search_index.add_item(item)
+            apply_item_change(before, item_snapshot(item))
+            user_stats_cache.invalidate(ref_id(item._data.get('seller')))
+            recommender.refresh_item(item)
+            invalidate_item(item.id, old_category, item.category)
             
             return jsonify({
                 "msg": "Item updated successfully",
@@ -353,11 +379,17 @@ def delete_item(item_id):
             return jsonify({"msg": "Item not found"}), 404
         
         # 检查是否是商品卖家
-        if str(item.seller.id) != current_user_id:
+        if str(ref_id(item._data.get('seller'))) != current_user_id:
             return jsonify({"msg": "Unauthorized: You are not the seller of this item"}), 403
         
         # 删除商品
         item.delete()
+        search_index.remove_item(item_id)
+        apply_item_change(item_snapshot(item), None)
+        user_stats_cache.invalidate(current_user_id)
+        recommender.discard_item(item_id)
+        remove_item_favorites(item_id)
+        invalidate_item(item_id, item.category)
         
         return jsonify({"msg": "Item deleted successfully"}), 200
     except Exception as e:
@@ -371,39 +403,23 @@ def get_user_items():
     current_user_id = get_jwt_identity()
     
     try:
-        # 查询当前用户发布的所有商品
-        items = Item.objects(seller=current_user_id)
-        
-        # 获取总数
-        total_count = items.count()
+        # 查询当前用户发布的所有商品（默认卡片视图）
+        view = item_view(request.args.get('fields'))
+        docs = project_items(Item.objects(seller=current_user_id), view)
         
         # 格式化结果
-        result = []
-        for item in items:
-            seller_data = {
-                "id": str(item.seller.id),
-                "username": item.seller.username
-            }
-            
-            result.append({
-                "id": str(item.id),
-                "title": item.title,
-                "description": item.description,
-                "price": item.price,
-                "category": item.category,
-                "images": item.images,
-                "seller": seller_data,
-                "created_at": item.created_at.isoformat(),
-                "updated_at": item.updated_at.isoformat(),
-                "status": item.status,
-                "views": item.views
-            })
+        result = serialize_item_docs(docs, view)
+        
+        # 获取总数
+        total_count = len(result)
         
         # 返回结果
         return jsonify({
             "total": total_count,
             "items": result
         }), 200
+    except (InvalidView, InvalidCursor) as e:
+        return jsonify({"msg": str(e)}), 400
     except Exception as e:
         print(f"Error fetching user items: {e}")
         return jsonify({"msg": "An internal error occurred"}), 500 
\ No newline at end of file
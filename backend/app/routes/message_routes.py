@@ -1,8 +1,15 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from ..models.message_model import Message
-from ..models.user_model import User
 from ..models.item_model import Item
+from ..models.conversation_model import Conversation
+from ..services.user_cache import user_cache
+from ..services.conversation_service import (
+    record_message, mark_messages_read, ensure_conversations, conversation_query
+)
+from ..utils.item_serializer import resolve_users, resolve_items, ref_id
+from ..utils.pagination import keyset_page
+from ..utils.fast_json import parse_datetime
 from mongoengine.errors import ValidationError, DoesNotExist
 
 message_bp = Blueprint('message_bp', __name__)
@@ -10,62 +17,74 @@ message_bp = Blueprint('message_bp', __name__)
 @message_bp.route('/<user_id>', methods=['GET'])
 @jwt_required()
 def get_messages(user_id):
-    """获取当前用户与指定用户之间的聊天记录"""
+    """获取当前用户与指定用户之间的聊天记录，按窗口分页：默认返回最新的 limit 条，
+    before 传入时间戳或上一页返回的 next_before 可继续加载更早的消息"""
     current_user_id = get_jwt_identity()
+    before = request.args.get('before', '')
+    limit = min(int(request.args.get('limit', 50)), 200)
     
     # 检查当前用户是否存在
-    current_user = User.objects(id=current_user_id).first()
+    current_user = user_cache.get(current_user_id)
     if not current_user:
         return jsonify({"msg": "Current user not found"}), 404
     
     # 检查目标用户是否存在
-    target_user = User.objects(id=user_id).first()
+    target_user = user_cache.get(user_id)
     if not target_user:
         return jsonify({"msg": "Target user not found"}), 404
     
     try:
-        # 获取双方之间的对话记录
-        messages = Message.objects(
-            (Message.sender == current_user) & (Message.receiver == target_user) |
-            (Message.sender == target_user) & (Message.receiver == current_user)
-        ).order_by('timestamp')
+        # 获取双方之间的对话记录（不解引用发送者和商品）
+        conversation = Message.objects(__raw__=conversation_query(current_user.id, target_user.id)).no_dereference()
+        cursor = None
+        if before:
+            try:
+                conversation = conversation.filter(timestamp__lt=parse_datetime(before))
+            except ValueError:
+                cursor = before  # 不是时间戳，按游标处理
+        
+        # 从新到旧取一个窗口，再按时间正序返回
+        window, next_before = keyset_page(conversation, ('-timestamp', '-id'), cursor, limit)
+        window.reverse()
+        
+        # 批量获取关联商品的标题
+        items = resolve_items([ref_id(msg._data.get('item')) for msg in window])
         
         # 格式化消息
         result = []
-        for msg in messages:
+        last_timestamp = None
+        for msg in window:
+            last_timestamp = msg.timestamp
             message_data = {
                 "id": str(msg.id),
                 "content": msg.content,
-                "timestamp": msg.timestamp.isoformat(),
-                "is_sender": str(msg.sender.id) == current_user_id,
+                "timestamp": msg.timestamp,
+                "is_sender": str(ref_id(msg._data.get('sender'))) == current_user_id,
                 "read": msg.read
             }
             
             # 如果消息与商品相关，添加商品信息
-            if msg.item:
-                message_data["item"] = {
-                    "id": str(msg.item.id),
-                    "title": msg.item.title
-                }
+            item = items.get(ref_id(msg._data.get('item')))
+            if item:
+                message_data["item"] = item
             
             result.append(message_data)
         
-        # 将收到的未读消息标记为已读
-        unread_messages = Message.objects(
-            (Message.sender == target_user) & 
-            (Message.receiver == current_user) &
-            (Message.read == False)
-        )
-        for msg in unread_messages:
-            msg.mark_as_read()
+        # 将已返回的收到消息一次性标记为已读（以最后一条消息的时间为水位）
+        if last_timestamp:
+            mark_messages_read(current_user.id, target_user.id, up_to=last_timestamp)
         
         return jsonify({
             "messages": result,
+            "next_before": next_before,
+            "has_more": next_before is not None,
             "user": {
                 "id": str(target_user.id),
                 "username": target_user.username
             }
         }), 200
+    except ValueError as e:
+        return jsonify({"msg": str(e)}), 400
     except Exception as e:
         print(f"Error fetching messages: {e}")
         return jsonify({"msg": "An internal error occurred"}), 500
@@ -77,7 +96,7 @@ def send_message():
     current_user_id = get_jwt_identity()
     
     # 检查当前用户是否存在
-    current_user = User.objects(id=current_user_id).first()
+    current_user = user_cache.get(current_user_id)
     if not current_user:
         return jsonify({"msg": "Current user not found"}), 404
     
@@ -90,31 +109,32 @@ def send_message():
         return jsonify({"msg": "Missing receiver_id or content"}), 400
     
     # 检查接收者是否存在
-    receiver = User.objects(id=data.get('receiver_id')).first()
+    receiver = user_cache.get(data.get('receiver_id'))
     if not receiver:
         return jsonify({"msg": "Receiver not found"}), 404
     
     try:
         # 创建新消息
         new_message = Message(
-            sender=current_user,
-            receiver=receiver,
+            sender=current_user.id,
+            receiver=receiver.id,
             content=data.get('content')
         )
         
         # 如果指定了商品，添加商品引用
         if 'item_id' in data and data.get('item_id'):
-            item = Item.objects(id=data.get('item_id')).first()
+            item = Item.objects(id=data.get('item_id')).only('id').first()
             if item:
                 new_message.item = item
         
         new_message.save()
+        record_message(current_user.id, receiver.id, new_message.content, new_message.timestamp)
         
         # 返回消息ID，用于前端确认消息已发送
         return jsonify({
             "msg": "Message sent successfully",
             "message_id": str(new_message.id),
-            "timestamp": new_message.timestamp.isoformat()
+            "timestamp": new_message.timestamp
         }), 201
     except ValidationError as e:
         return jsonify({"msg": "Validation error", "errors": str(e)}), 400
@@ -129,16 +149,13 @@ def get_unread_count():
     current_user_id = get_jwt_identity()
     
     # 检查当前用户是否存在
-    current_user = User.objects(id=current_user_id).first()
+    current_user = user_cache.get(current_user_id)
     if not current_user:
         return jsonify({"msg": "Current user not found"}), 404
     
     try:
         # 查询未读消息数量
-        unread_count = Message.objects(
-            (Message.receiver == current_user) &
-            (Message.read == False)
-        ).count()
+        unread_count = Message.objects(receiver=current_user.id, read=False).count()
         
         # 按发送者分组统计未读消息
         pipeline = [
@@ -158,16 +175,19 @@ def get_unread_count():
             }
         ]
         
+        # 批量获取发送者的用户名
+        results = list(Message.objects.aggregate(pipeline))
+        senders = resolve_users([result['_id'] for result in results])
         unread_by_sender = []
-        for result in Message.objects.aggregate(pipeline):
-            sender = User.objects(id=result['_id']).first()
+        for result in results:
+            sender = senders.get(result['_id'])
             if sender:
                 unread_by_sender.append({
-                    "sender_id": str(sender.id),
-                    "sender_username": sender.username,
+                    "sender_id": sender['id'],
+                    "sender_username": sender['username'],
                     "count": result['count'],
                     "last_message": result['last_message'],
-                    "last_timestamp": result['last_timestamp'].isoformat()
+                    "last_timestamp": result['last_timestamp']
                 })
         
         return jsonify({
@@ -185,56 +205,30 @@ def get_contacts():
     current_user_id = get_jwt_identity()
     
     # 检查当前用户是否存在
-    current_user = User.objects(id=current_user_id).first()
+    current_user = user_cache.get(current_user_id)
     if not current_user:
         return jsonify({"msg": "Current user not found"}), 404
     
     try:
-        # 查询与当前用户有过对话的所有用户
-        # 先找出当前用户发送或接收的所有消息
-        sent_messages = Message.objects(sender=current_user)
-        received_messages = Message.objects(receiver=current_user)
-        
-        # 提取这些消息中涉及的用户ID
-        contact_ids = set()
+        # 从会话摘要集合读取联系人，已按最后消息时间排序
+        # 会话摘要的补建尚未完成时，每个用户只重建一次自己的摘要
+        ensure_conversations(current_user.id)
+        rows = list(Conversation.objects(owner=current_user.id).order_by('-last_timestamp').as_pymongo())
         
-        for msg in sent_messages:
-            contact_ids.add(str(msg.receiver.id))
-        
-        for msg in received_messages:
-            contact_ids.add(str(msg.sender.id))
-        
-        # 获取这些用户的详细信息
+        # 批量获取联系人的用户名
+        users = resolve_users([row['peer'] for row in rows])
         contacts = []
-        for user_id in contact_ids:
-            user = User.objects(id=user_id).first()
+        for row in rows:
+            user = users.get(row['peer'])
             if not user:
                 continue
-                
-            # 获取最后一条消息
-            last_message = Message.objects(
-                (Message.sender == current_user) & (Message.receiver == user) |
-                (Message.sender == user) & (Message.receiver == current_user)
-            ).order_by('-timestamp').first()
-            
-            # 获取未读消息数量
-            unread_count = Message.objects(
-                (Message.sender == user) &
-                (Message.receiver == current_user) &
-                (Message.read == False)
-            ).count()
-            
-            if last_message:
-                contacts.append({
-                    "user_id": str(user.id),
-                    "username": user.username,
-                    "last_message": last_message.content,
-                    "last_timestamp": last_message.timestamp.isoformat(),
-                    "unread_count": unread_count
-                })
-        
-        # 按最后消息时间排序
-        contacts.sort(key=lambda x: x['last_timestamp'], reverse=True)
+            contacts.append({
+                "user_id": user['id'],
+                "username": user['username'],
+                "last_message": row.get('last_message'),
+                "last_timestamp": row['last_timestamp'],
+                "unread_count": row.get('unread_count', 0)
+            })
         
         return jsonify({
             "contacts": contacts
@@ -2,6 +2,12 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from ..models.user_model import User # 导入用户模型
 from ..models.item_model import Item
+from ..services.user_cache import user_cache
+from ..services.admin_stats import record_created
+from ..services.browse_history_service import record_view, recent_history
+from ..services import favorite_service
+from ..services.user_stats import user_stats_cache
+from ..utils.item_serializer import item_cards, to_object_id
 from mongoengine.errors import NotUniqueError, ValidationError
 import datetime
 import pymongo
@@ -44,7 +50,7 @@ def health_check():
         # 返回系统状态
         return jsonify({
             "status": "ok" if db_status == "connected" else "error",
-            "timestamp": datetime.datetime.utcnow().isoformat(),
+            "timestamp": datetime.datetime.utcnow(),
             "database": {
                 "status": db_status,
                 "error": db_error
@@ -57,7 +63,7 @@ def health_check():
     except Exception as e:
         return jsonify({
             "status": "error",
-            "timestamp": datetime.datetime.utcnow().isoformat(),
+            "timestamp": datetime.datetime.utcnow(),
             "error": str(e)
         }), 500
 
@@ -85,6 +91,7 @@ def register():
         new_user = User(username=username, email=email)
         new_user.set_password(password) # 哈希密码
         new_user.save() # 保存到数据库
+        record_created('users', new_user.created_at)
         return jsonify({"msg": "User registered successfully"}), 201 # 201 Created
     except NotUniqueError: # MongoEngine 会在 unique 字段冲突时抛出此异常
         return jsonify({"msg": "Username or email already exists"}), 409
@@ -124,7 +131,7 @@ def refresh_token():
     
     try:
         # 验证用户是否存在
-        user = User.objects(id=current_user_id).first()
+        user = user_cache.get(current_user_id)
         if not user:
             return jsonify({"msg": "User not found"}), 404
         
@@ -146,7 +153,7 @@ def check_auth():
     current_user_id = get_jwt_identity()
     
     try:
-        user = User.objects(id=current_user_id).first()
+        user = user_cache.get(current_user_id)
         if not user:
             return jsonify({"authenticated": False, "msg": "User not found"}), 404
         
@@ -154,7 +161,7 @@ def check_auth():
             "authenticated": True,
             "user_id": current_user_id,
             "username": user.username,
-            "timestamp": datetime.datetime.utcnow().isoformat()
+            "timestamp": datetime.datetime.utcnow()
         }), 200
     except Exception as e:
         print(f"Error checking authentication: {e}")
@@ -167,28 +174,17 @@ def get_browse_history():
     current_user_id = get_jwt_identity()
     
     try:
-        user = User.objects(id=current_user_id).first()
+        user = user_cache.get(current_user_id)
         if not user:
             return jsonify({"msg": "User not found"}), 404
 
-        # 假设user.browse_history是一个列表，包含 {item_id, viewed_at} 的字典
-        history = []
-        
-        if hasattr(user, 'browse_history'):
-            for entry in user.browse_history:
-                try:
-                    item = Item.objects(id=entry['item_id']).first()
-                    if item:  # 确保商品仍然存在
-                        history.append({
-                            "id": str(item.id),
-                            "title": item.title,
-                            "price": item.price,
-                            "images": item.images,
-                            "category": item.category,
-                            "viewedAt": entry['viewed_at'].isoformat()
-                        })
-                except Exception as e:
-                    print(f"Error getting history item: {e}")
+        # 浏览记录保存在独立的集合中，按浏览时间倒序；商品信息一次批量获取，已删除的商品被跳过
+        entries = recent_history(user.id)
+        cards = item_cards([entry['item'] for entry in entries])
+        history = [
+            dict(cards[entry['item']], viewedAt=entry['viewed_at'])
+            for entry in entries if entry['item'] in cards
+        ]
         
         return jsonify({"history": history}), 200
     
@@ -203,39 +199,16 @@ def add_to_browse_history(item_id):
     current_user_id = get_jwt_identity()
     
     try:
-        user = User.objects(id=current_user_id).first()
+        user = user_cache.get(current_user_id)
         if not user:
             return jsonify({"msg": "User not found"}), 404
         
         # 检查商品是否存在
-        item = Item.objects(id=item_id).first()
-        if not item:
+        if not Item.objects(id=item_id).only('id').first():
             return jsonify({"msg": "Item not found"}), 404
         
-        # 准备历史记录条目
-        history_entry = {
-            "item_id": item_id,
-            "viewed_at": datetime.datetime.utcnow()
-        }
-        
-        # 检查是否已经有browse_history字段
-        if not hasattr(user, 'browse_history'):
-            user.browse_history = []
-        
-        # 检查是否已在历史记录中，如果是则删除旧记录
-        for i, entry in enumerate(user.browse_history):
-            if entry['item_id'] == item_id:
-                user.browse_history.pop(i)
-                break
-        
-        # 添加到历史记录的开头
-        user.browse_history.insert(0, history_entry)
-        
-        # 仅保留最近的30条记录
-        if len(user.browse_history) > 30:
-            user.browse_history = user.browse_history[:30]
-        
-        user.save()
+        # 一次原子 upsert：已浏览过的商品只更新浏览时间，不再改写整个用户文档
+        record_view(user.id, item_id)
         
         return jsonify({"msg": "Item added to browse history"}), 200
     
@@ -259,7 +232,7 @@ def get_profile():
             "id": str(user.id),
             "username": user.username,
             "email": user.email,
-            "created_at": user.created_at.isoformat() if hasattr(user, 'created_at') else None,
+            "created_at": user.created_at if hasattr(user, 'created_at') else None,
             "avatar": user.avatar_url if hasattr(user, 'avatar_url') else None,
             "bio": user.bio if hasattr(user, 'bio') else None
         }), 200
@@ -297,6 +270,7 @@ def update_profile():
             
         # 保存更改
         user.save()
+        user_cache.invalidate(user.id)
         
         return jsonify({
             "msg": "Profile updated successfully",
@@ -328,7 +302,7 @@ def get_current_user():
             "id": str(user.id),
             "username": user.username,
             "email": user.email,
-            "created_at": user.created_at.isoformat() if hasattr(user, 'created_at') else None,
+            "created_at": user.created_at if hasattr(user, 'created_at') else None,
             "avatar": user.avatar_url if hasattr(user, 'avatar_url') else None,
             "bio": user.bio if hasattr(user, 'bio') else None
         }), 200
@@ -371,6 +345,7 @@ def update_user():
             
             # 保存更改
             user.save()
+            user_cache.invalidate(user.id)
             
             return jsonify({
                 "msg": "User information updated successfully",
@@ -416,6 +391,7 @@ def update_user():
             
             # 保存更改
             user.save()
+            user_cache.invalidate(user.id)
             
             return jsonify({
                 "msg": "User information updated successfully",
@@ -473,20 +449,13 @@ def get_favorites():
     current_user_id = get_jwt_identity()
     
     try:
-        user = User.objects(id=current_user_id).first()
-        if not user:
-            return jsonify({"msg": "User not found"}), 404
-            
-        # 初始化收藏列表
-        favorites = []
-        
-        # 如果用户模型中有收藏字段
-        if hasattr(user, 'favorites') and user.favorites:
-            favorites = user.favorites
-        else:
-            # 如果用户模型中没有收藏字段，初始化一个空列表
-            user.favorites = []
-            user.save()
+        # 按收藏时间倒序，附带最新的商品卡片，已删除的商品不再返回
+        entries = favorite_service.list_favorites(current_user_id)
+        cards = item_cards([entry['item'] for entry in entries])
+        favorites = [
+            {"item_id": str(entry['item']), "added_at": entry.get('added_at'), "item": cards[entry['item']]}
+            for entry in entries if entry['item'] in cards
+        ]
         
         return jsonify({"favorites": favorites}), 200
     except Exception as e:
@@ -500,36 +469,20 @@ def add_favorite(item_id):
     current_user_id = get_jwt_identity()
     
     try:
-        user = User.objects(id=current_user_id).first()
-        if not user:
-            return jsonify({"msg": "User not found"}), 404
-            
         # 检查商品是否存在
-        item = Item.objects(id=item_id).first()
-        if not item:
+        if to_object_id(item_id) is None or not Item.objects(id=item_id).only('id').as_pymongo().first():
             return jsonify({"msg": "Item not found"}), 404
             
-        # 初始化收藏列表（如果不存在）
-        if not hasattr(user, 'favorites'):
-            user.favorites = []
-            
-        # 检查是否已经收藏
-        for fav in user.favorites:
-            if fav.get('item_id') == item_id:
-                return jsonify({"msg": "Item already in favorites", "success": True}), 200
-                
-        # 添加到收藏列表
-        favorite_item = {
-            "item_id": item_id,
-            "added_at": datetime.datetime.utcnow()
-        }
-        user.favorites.append(favorite_item)
-        user.save()
+        # 唯一索引保证重复收藏不会写入第二条记录
+        entry, created = favorite_service.add_favorite(current_user_id, item_id)
+        if not created:
+            return jsonify({"msg": "Item already in favorites", "success": True}), 200
+        user_stats_cache.invalidate(current_user_id)
         
         return jsonify({
             "msg": "Item added to favorites",
             "success": True,
-            "favorite": favorite_item
+            "favorite": {"item_id": item_id, "added_at": entry['added_at']}
         }), 201
     except Exception as e:
         print(f"Error adding to favorites: {e}")
@@ -542,24 +495,8 @@ def remove_favorite(item_id):
     current_user_id = get_jwt_identity()
     
     try:
-        user = User.objects(id=current_user_id).first()
-        if not user:
-            return jsonify({"msg": "User not found"}), 404
-            
-        # 检查是否有收藏列表
-        if not hasattr(user, 'favorites') or not user.favorites:
-            return jsonify({"msg": "No favorites found", "success": True}), 200
-            
-        # 查找并移除收藏
-        found = False
-        for i, fav in enumerate(user.favorites):
-            if fav.get('item_id') == item_id:
-                user.favorites.pop(i)
-                found = True
-                break
-                
-        if found:
-            user.save()
+        if to_object_id(item_id) is not None and favorite_service.remove_favorite(current_user_id, item_id):
+            user_stats_cache.invalidate(current_user_id)
             return jsonify({"msg": "Item removed from favorites", "success": True}), 200
         else:
             return jsonify({"msg": "Item not found in favorites", "success": True}), 200
@@ -574,24 +511,32 @@ def check_favorite(item_id):
     current_user_id = get_jwt_identity()
     
     try:
-        user = User.objects(id=current_user_id).first()
-        if not user:
-            return jsonify({"msg": "User not found"}), 404
-            
-        # 检查是否有收藏列表
-        if not hasattr(user, 'favorites') or not user.favorites:
-            return jsonify({"is_favorite": False}), 200
-            
-        # 检查是否已收藏
-        for fav in user.favorites:
-            if fav.get('item_id') == item_id:
-                return jsonify({"is_favorite": True}), 200
-                
-        return jsonify({"is_favorite": False}), 200
+        return jsonify({"is_favorite": bool(favorite_service.favorited_ids(current_user_id, [item_id]))}), 200
     except Exception as e:
         print(f"Error checking favorite: {e}")
         return jsonify({"msg": "An internal error occurred"}), 500
 
+@user_bp.route('/favorites/check', methods=['POST'])
+@jwt_required()
+def check_favorites():
+    """批量检查一页商品的收藏状态，请求体为 {"item_ids": [...]}，返回 {"favorites": {商品ID: 是否已收藏}}"""
+    current_user_id = get_jwt_identity()
+    data = request.get_json(silent=True) or {}
+    item_ids = data.get('item_ids')
+    
+    if not isinstance(item_ids, list):
+        return jsonify({"msg": "item_ids must be a list"}), 400
+    if len(item_ids) > favorite_service.CHECK_LIMIT:
+        return jsonify({"msg": f"At most {favorite_service.CHECK_LIMIT} item_ids per request"}), 400
+        
+    try:
+        item_ids = [str(item_id) for item_id in item_ids]
+        favorited = {str(item_id) for item_id in favorite_service.favorited_ids(current_user_id, item_ids)}
+        return jsonify({"favorites": {item_id: item_id in favorited for item_id in item_ids}}), 200
+    except Exception as e:
+        print(f"Error checking favorites: {e}")
+        return jsonify({"msg": "An internal error occurred"}), 500
+
 # 可以在这里添加其他用户相关的路由，例如获取用户信息、更新用户信息等
 # @user_bp.route('/profile', methods=['GET'])
 # @jwt_required()
@@ -0,0 +1,124 @@
+import datetime
+from pymongo import UpdateOne
+from ..models.comment import Comment
+from ..models.daily_stats_model import DailyStats
+from ..models.item_model import Item
+from ..models.user_model import User
+from .user_cache import TTLCache
+
+# 统计指标及对应的集合
+METRICS = {
+    'users': User,
+    'items': Item,
+    'comments': Comment,
+}
+# 日统计保留的天数，趋势图最多查询这么多天
+RETENTION_DAYS = 90
+
+
+def _day(when):
+    return when.strftime('%Y-%m-%d')
+
+
+def _days(count, today=None):
+    # 截止今天（含）的最近 count 个 UTC 日期，按时间正序
+    today = today or datetime.datetime.utcnow()
+    return [_day(today - datetime.timedelta(days=offset)) for offset in range(count - 1, -1, -1)]
+
+
+def record_created(metric, when=None, count=1):
+    """新建文档后累加当天的计数"""
+    try:
+        DailyStats._get_collection().update_one(
+            {'metric': metric, 'day': _day(when or datetime.datetime.utcnow())},
+            {'$inc': {'count': count}},
+            upsert=True
+        )
+    except Exception as e:
+        # 计数只是派生数据，失败时由定期校对修正
+        print(f"Error recording daily stats: {e}")
+
+
+def reconcile_daily_stats(days=RETENTION_DAYS):
+    """按 created_at 重新汇总最近 days 天的日统计，修正漂移（删除的文档、历史数据），并清理过期的统计"""
+    start = datetime.datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) - datetime.timedelta(days=days - 1)
+    operations = []
+    for metric, document in METRICS.items():
+        counts = {day: 0 for day in _days(days)}
+        for result in document._get_collection().aggregate([
+            {'$match': {'created_at': {'$gte': start}}},
+            {'$group': {'_id': {'$dateToString': {'format': '%Y-%m-%d', 'date': '$created_at'}}, 'count': {'$sum': 1}}}
+        ]):
+            counts[result['_id']] = result['count']
+        operations.extend(
+            UpdateOne({'metric': metric, 'day': day}, {'$set': {'count': count}}, upsert=True)
+            for day, count in counts.items()
+        )
+    collection = DailyStats._get_collection()
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    collection.delete_many({'day': {'$lt': _day(start)}})
+    return len(operations)
+
+
+class AdminStats:
+    """管理后台统计：总数使用 estimated_document_count，近 N 天新增从日统计汇总，结果在允许的陈旧时间内复用"""
+
+    def __init__(self):
+        self.max_age = 60
+        self.reconcile_seconds = 3600
+        self._cache = TTLCache(max_entries=16)
+
+    def init_app(self, app):
+        """读取配置"""
+        self.max_age = app.config.get('ADMIN_STATS_MAX_AGE_SECONDS', 60)
+        self.reconcile_seconds = app.config.get('ADMIN_STATS_RECONCILE_SECONDS', 3600)
+
+    def _cached(self, key, compute):
+        value = self._cache.get(key)
+        if value is None:
+            value = compute()
+            value['as_of'] = datetime.datetime.utcnow()
+            self._cache.set(key, value, self.max_age)
+        return value
+
+    def _buckets(self, days):
+        # 一次读取所有指标最近 days 天的日统计，返回 {指标: {日期: 数量}}
+        first_day = _days(days)[0]
+        buckets = {metric: {} for metric in METRICS}
+        for doc in DailyStats.objects(day__gte=first_day).only('metric', 'day', 'count').as_pymongo():
+            if doc['metric'] in buckets:
+                buckets[doc['metric']][doc['day']] = doc.get('count', 0)
+        return buckets
+
+    def dashboard(self):
+        """总数和最近 7 天（含今天）的新增数"""
+        def compute():
+            buckets = self._buckets(7)
+            return {
+                'total_users': User._get_collection().estimated_document_count(),
+                'total_items': Item._get_collection().estimated_document_count(),
+                'total_comments': Comment._get_collection().estimated_document_count(),
+                'new_users_count': sum(buckets['users'].values()),
+                'new_items_count': sum(buckets['items'].values()),
+                'new_comments_count': sum(buckets['comments'].values())
+            }
+        return self._cached('dashboard', compute)
+
+    def time_series(self, days=30):
+        """最近 days 天每天的新增数，没有数据的日期补 0"""
+        days = max(1, min(days, RETENTION_DAYS))
+
+        def compute():
+            buckets = self._buckets(days)
+            return {
+                'days': days,
+                'series': [
+                    dict({'date': day}, **{metric: buckets[metric].get(day, 0) for metric in METRICS})
+                    for day in _days(days)
+                ]
+            }
+        return self._cached(f"series:{days}", compute)
+
+
+admin_stats = AdminStats()
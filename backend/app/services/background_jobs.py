@@ -0,0 +1,110 @@
+import threading
+import time
+import uuid
+import redis
+
+
+class BackgroundJobs:
+    """全量扫描类后台任务（索引校对、数据回填、统计校对、推荐重算）的调度：
+    BACKGROUND_JOBS 关闭时不启动（命令行脚本也不启动）；多进程部署（REALTIME_CLUSTERED）时
+    通过 Redis 锁只在一个进程中运行，持锁进程退出或续期失败后锁过期，由其他进程接管。
+    周期任务每次执行前都检查本进程是否仍持有锁，失去锁后暂停，不会与新的持锁进程同时运行"""
+
+    LOCK_KEY = 'background_jobs:leader'
+
+    def __init__(self):
+        self._jobs = []      # [(名称, 启动函数)]：一次性任务
+        self._periodic = []  # [(名称, 执行函数, 间隔秒数)]：周期任务
+        self._token = uuid.uuid4().hex
+        self._started = False
+        self._clustered = False
+        self._leader_until = 0.0  # 本进程持有锁的有效期（time.monotonic），留出余量早于锁在 Redis 中过期
+        self.lock_seconds = 60
+
+    def register(self, name, start):
+        """登记一个一次性任务，start 为启动函数（成为持锁进程时调用一次）"""
+        self._jobs.append((name, start))
+
+    def register_periodic(self, name, run, interval):
+        """登记一个周期任务：成为持锁进程后立即执行一次，之后每 interval 秒执行一次"""
+        self._periodic.append((name, run, interval))
+
+    def init_app(self, app, redis_client=None, enabled=None):
+        """按配置决定是否（以及在哪个进程中）运行已登记的后台任务；enabled 为 None 时读取 BACKGROUND_JOBS"""
+        if enabled is None:
+            enabled = app.config.get('BACKGROUND_JOBS', True)
+        if not enabled:
+            print("Background jobs: disabled in this process")
+            return
+        self.lock_seconds = app.config.get('BACKGROUND_JOBS_LOCK_SECONDS', 60)
+        if not app.config.get('REALTIME_CLUSTERED') or redis_client is None:
+            self._start()
+            return
+        self._clustered = True
+        threading.Thread(target=self._elect, args=(redis_client,), name='background-jobs-leader', daemon=True).start()
+
+    @property
+    def leader(self):
+        """本进程当前是否应运行后台任务"""
+        if not self._started:
+            return False
+        return not self._clustered or time.monotonic() < self._leader_until
+
+    def _start(self):
+        if self._started:
+            return
+        self._started = True
+        names = [name for name, _ in self._jobs] + [name for name, _, _ in self._periodic]
+        print(f"Background jobs: starting {', '.join(names)}")
+        for name, start in self._jobs:
+            try:
+                start()
+            except Exception as e:
+                print(f"Error starting background job {name}: {e}")
+        for name, run, interval in self._periodic:
+            threading.Thread(target=self._run_periodic, args=(name, run, interval),
+                             name=f"job-{name.replace(' ', '-')}", daemon=True).start()
+
+    def _run_periodic(self, name, run, interval):
+        while True:
+            if self.leader:
+                try:
+                    run()
+                except Exception as e:
+                    print(f"Error running background job {name}: {e}")
+            time.sleep(interval)
+
+    def _renew(self, redis_client):
+        # 仅当锁仍属于本进程时续期（WATCH 保证检查与续期之间锁没有易主）
+        with redis_client.pipeline() as pipe:
+            try:
+                pipe.watch(self.LOCK_KEY)
+                if pipe.get(self.LOCK_KEY) != self._token.encode():
+                    return False
+                pipe.multi()
+                pipe.expire(self.LOCK_KEY, self.lock_seconds)
+                return bool(pipe.execute()[0])
+            except redis.exceptions.WatchError:
+                return False
+
+    def _elect(self, redis_client):
+        # 定期尝试获取或续期领导锁；获得锁的进程启动后台任务，续期失败时立即放弃领导权
+        while True:
+            checked_at = time.monotonic()
+            try:
+                held = bool(redis_client.set(self.LOCK_KEY, self._token, nx=True, ex=self.lock_seconds))
+                if not held:
+                    held = self._renew(redis_client)
+            except redis.exceptions.RedisError as e:
+                print(f"Background jobs leader election error: {e}")
+                held = False
+            if held:
+                self._leader_until = checked_at + self.lock_seconds * 2 / 3
+                self._start()
+            elif self._leader_until:
+                self._leader_until = 0.0
+                print("Background jobs: lost the leader lock, pausing jobs in this process")
+            time.sleep(self.lock_seconds / 3)
+
+
+background_jobs = BackgroundJobs()
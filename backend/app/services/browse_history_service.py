@@ -0,0 +1,71 @@
+import datetime
+import threading
+from bson import ObjectId
+from pymongo import UpdateOne
+from ..models.browse_history_model import BrowseHistory
+from ..models.user_model import User
+
+# 浏览历史接口返回的最大条数
+HISTORY_LIMIT = 30
+
+
+def record_view(user_id, item_id, viewed_at=None):
+    """记录一次浏览：按 (用户, 商品) 原子 upsert，只更新浏览时间"""
+    BrowseHistory._get_collection().update_one(
+        {'user': ObjectId(str(user_id)), 'item': ObjectId(str(item_id))},
+        {'$set': {'viewed_at': viewed_at or datetime.datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def recent_history(user_id, limit=HISTORY_LIMIT):
+    """按浏览时间倒序返回最近的浏览记录 [{item, viewed_at}]"""
+    return list(BrowseHistory._get_collection().find(
+        {'user': ObjectId(str(user_id))},
+        {'_id': 0, 'item': 1, 'viewed_at': 1}
+    ).sort('viewed_at', -1).limit(limit))
+
+
+def migrate_embedded_history(batch_size=500):
+    """将用户文档中内嵌的 browse_history 分批迁移到浏览记录集合并从用户文档中移除，返回迁移的用户数"""
+    users = User._get_collection()
+    history = BrowseHistory._get_collection()
+    migrated = 0
+    while True:
+        batch = list(users.find(
+            {'browse_history.0': {'$exists': True}},
+            {'browse_history': 1}
+        ).limit(batch_size))
+        if not batch:
+            break
+        operations = []
+        for doc in batch:
+            for entry in doc['browse_history']:
+                item_id = entry.get('item_id')
+                if not item_id or not ObjectId.is_valid(item_id):
+                    continue
+                # 已有更新的浏览记录时保留较新的时间
+                operations.append(UpdateOne(
+                    {'user': doc['_id'], 'item': ObjectId(item_id)},
+                    {'$max': {'viewed_at': entry.get('viewed_at') or datetime.datetime.utcnow()}},
+                    upsert=True
+                ))
+        if operations:
+            history.bulk_write(operations, ordered=False)
+        users.update_many({'_id': {'$in': [doc['_id'] for doc in batch]}}, {'$set': {'browse_history': []}})
+        migrated += len(batch)
+        print(f"Migrated browse history for {migrated} users")
+    return migrated
+
+
+def start_history_migration(batch_size=500):
+    """在后台线程中迁移内嵌的浏览历史，不阻塞应用启动"""
+    def run():
+        try:
+            migrate_embedded_history(batch_size)
+        except Exception as e:
+            print(f"Error migrating browse history: {e}")
+
+    thread = threading.Thread(target=run, name='browse-history-migration', daemon=True)
+    thread.start()
+    return thread
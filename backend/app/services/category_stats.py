@@ -0,0 +1,94 @@
+import datetime
+from bson import ObjectId
+from pymongo import UpdateOne
+from ..models.category_stats_model import CategoryStats
+from ..models.item_model import Item
+
+
+def item_snapshot(item):
+    """记录商品中影响分类统计的字段，商品不存在时传入 None"""
+    if item is None:
+        return None
+    return {
+        'category': item.category,
+        'status': item.status or 'available',
+        'price': item.price or 0.0,
+        'views': item.views or 0
+    }
+
+
+def _delta(snapshot, sign):
+    query = {'category': snapshot['category'], 'status': snapshot['status']}
+    if sign < 0:
+        # 只从计数为正的统计条目中减去；条目不存在或已为 0 时跳过，计数不会变为负数，由定期校对修正
+        query['count'] = {'$gt': 0}
+    return UpdateOne(
+        query,
+        {
+            '$inc': {'count': sign, 'price_sum': sign * snapshot['price'], 'views': sign * snapshot['views']},
+            '$set': {'updated_at': datetime.datetime.utcnow()}
+        },
+        upsert=sign > 0
+    )
+
+
+def apply_item_change(before, after):
+    """按商品修改前后的快照增量更新分类统计：新建时 before 为 None，删除时 after 为 None"""
+    if before == after:
+        return
+    operations = []
+    if before is not None:
+        operations.append(_delta(before, -1))
+    if after is not None:
+        operations.append(_delta(after, 1))
+    try:
+        CategoryStats._get_collection().bulk_write(operations, ordered=False)
+    except Exception as e:
+        # 统计只是派生数据，失败时由定期校对修正
+        print(f"Error updating category stats: {e}")
+
+
+def record_views(view_counts):
+    """浏览量写入商品后同步累加到分类统计，view_counts 为 {商品ID: 增量}"""
+    item_ids = [ObjectId(item_id) for item_id in view_counts if ObjectId.is_valid(item_id)]
+    if not item_ids:
+        return
+    totals = {}
+    for doc in Item.objects(id__in=item_ids).only('category', 'status').as_pymongo():
+        key = (doc.get('category'), doc.get('status', 'available'))
+        totals[key] = totals.get(key, 0) + view_counts.get(str(doc['_id']), 0)
+    operations = [
+        UpdateOne({'category': category, 'status': status}, {'$inc': {'views': views}})
+        for (category, status), views in totals.items() if views
+    ]
+    if operations:
+        CategoryStats._get_collection().bulk_write(operations, ordered=False)
+
+
+def reconcile_category_stats():
+    """用一次聚合从商品集合重算全部分类统计，修正增量更新产生的漂移，返回统计条目数"""
+    pipeline = [
+        {'$group': {
+            '_id': {'category': '$category', 'status': {'$ifNull': ['$status', 'available']}},
+            'count': {'$sum': 1},
+            'price_sum': {'$sum': '$price'},
+            'views': {'$sum': '$views'}
+        }}
+    ]
+    now = datetime.datetime.utcnow()
+    operations = []
+    keys = []
+    for result in Item.objects.aggregate(pipeline):
+        keys.append(result['_id'])
+        operations.append(UpdateOne(
+            result['_id'],
+            {'$set': {'count': result['count'], 'price_sum': float(result['price_sum']),
+                      'views': result['views'], 'updated_at': now}},
+            upsert=True
+        ))
+    collection = CategoryStats._get_collection()
+    if operations:
+        collection.bulk_write(operations, ordered=False)
+    # 删除已经没有商品的分类统计
+    collection.delete_many({'$nor': keys} if keys else {})
+    return len(keys)
@@ -0,0 +1,235 @@
+import datetime
+import threading
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from ..models.conversation_model import Conversation
+from ..models.message_model import Message
+from .migration_state import is_complete, mark_complete
+from ..utils.fast_json import isoformat
+
+# 迁移名称：历史消息补写会话键、为所有用户补建会话摘要
+CONVERSATION_IDS = 'conversation_ids'
+CONVERSATION_SUMMARIES = 'conversation_summaries'
+
+
+def _oid(value):
+    return value if isinstance(value, ObjectId) else ObjectId(str(value))
+
+
+def _summary_operations(sender_id, receiver_id, content, timestamp):
+    sender_id, receiver_id = _oid(sender_id), _oid(receiver_id)
+    summary = {'last_message': content, 'last_timestamp': timestamp}
+    return [
+        UpdateOne({'owner': sender_id, 'peer': receiver_id},
+                  {'$set': summary, '$setOnInsert': {'unread_count': 0}}, upsert=True),
+        UpdateOne({'owner': receiver_id, 'peer': sender_id},
+                  {'$set': summary, '$inc': {'unread_count': 1}}, upsert=True),
+    ]
+
+
+def record_message(sender_id, receiver_id, content, timestamp):
+    """发送消息后更新双方的会话摘要，接收方未读数加一"""
+    Conversation._get_collection().bulk_write(
+        _summary_operations(sender_id, receiver_id, content, timestamp), ordered=False)
+
+
+def record_messages(messages):
+    """批量更新会话摘要，messages 为按时间排序的消息文档（原始字典）；
+    使用有序写入，保证同一会话的最后一条消息以最新的为准"""
+    operations = []
+    for doc in messages:
+        operations.extend(_summary_operations(doc['sender'], doc['receiver'], doc['content'], doc['timestamp']))
+    if operations:
+        Conversation._get_collection().bulk_write(operations, ordered=True)
+
+
+def conversation_query(user_a, user_b):
+    """两个用户之间全部消息的查询条件：会话键补写完成后按 conversation_id 索引查询，
+    补写完成前历史消息可能缺少会话键，按发送者/接收者查询"""
+    user_a, user_b = _oid(user_a), _oid(user_b)
+    if is_complete(CONVERSATION_IDS):
+        return {'conversation_id': Message.conversation_key(user_a, user_b)}
+    return {'$or': [{'sender': user_a, 'receiver': user_b}, {'sender': user_b, 'receiver': user_a}]}
+
+
+def mark_conversation_read(owner_id, peer_id, count=None):
+    """owner 阅读了 peer 发来的消息：count 为空时清零未读数，否则减去 count"""
+    query = {'owner': _oid(owner_id), 'peer': _oid(peer_id)}
+    collection = Conversation._get_collection()
+    if count is None:
+        collection.update_one(query, {'$set': {'unread_count': 0}})
+    elif count > 0:
+        result = collection.update_one({**query, 'unread_count': {'$gte': count}}, {'$inc': {'unread_count': -count}})
+        if not result.matched_count:
+            # 未读数不足（摘要有漂移）时直接清零，避免出现负数
+            collection.update_one(query, {'$set': {'unread_count': 0}})
+
+
+def mark_messages_read(reader_id, sender_id, up_to=None, message_id=None):
+    """批量回执：用一次 update_many 将 sender 发给 reader、时间不晚于 up_to 的未读消息标记为已读，
+    并向 sender 发送一条 message_read 事件；返回 (更新数量, 水位时间)"""
+    from .. import socketio
+
+    reader_id, sender_id = _oid(reader_id), _oid(sender_id)
+    up_to = up_to or datetime.datetime.utcnow()
+    # 按 (receiver, read) 索引查询，不依赖会话键（历史消息的会话键可能尚未补写）
+    result = Message._get_collection().update_many(
+        {
+            'receiver': reader_id,
+            'sender': sender_id,
+            'timestamp': {'$lte': up_to},
+            'read': False
+        },
+        {'$set': {'read': True}}
+    )
+    count = result.modified_count
+    if count:
+        mark_conversation_read(reader_id, sender_id, count=count)
+        payload = {
+            'reader_id': str(reader_id),
+            'up_to': isoformat(up_to),
+            'count': count,
+            'read_at': isoformat(datetime.datetime.utcnow())
+        }
+        if message_id:
+            payload['message_id'] = str(message_id)
+        socketio.emit('message_read', payload, room=str(sender_id))
+    return count, up_to
+
+
+def rebuild_conversations(user_id):
+    """用一次聚合从消息集合重建某个用户的全部会话摘要（用于历史数据和修正漂移）；
+    与补建相同，不覆盖聚合期间由 record_message 写入的更新的摘要"""
+    user_id = _oid(user_id)
+    started_at = datetime.datetime.utcnow()
+    pipeline = [
+        {'$match': {'$or': [{'sender': user_id}, {'receiver': user_id}]}},
+        {'$sort': {'timestamp': -1}},
+        {'$group': {
+            '_id': {'$cond': [{'$eq': ['$sender', user_id]}, '$receiver', '$sender']},
+            'last_message': {'$first': '$content'},
+            'last_timestamp': {'$first': '$timestamp'},
+            'unread_count': {'$sum': {'$cond': [
+                {'$and': [{'$eq': ['$receiver', user_id]}, {'$eq': ['$read', False]}]}, 1, 0
+            ]}}
+        }}
+    ]
+    rows = [dict(row, _id={'owner': user_id, 'peer': row['_id']}) for row in Message.objects.aggregate(pipeline)]
+    collection = Conversation._get_collection()
+    peers = [row['_id']['peer'] for row in rows]
+    # 删除已经没有消息的会话（聚合开始之后才有消息的会话不删除）
+    collection.delete_many({'owner': user_id, 'peer': {'$nin': peers}, 'last_timestamp': {'$lte': started_at}})
+    if rows:
+        _write_summaries(collection, rows)
+    return len(rows)
+
+
+def ensure_conversations(user_id):
+    """会话摘要的补建尚未完成时，为用户重建一次会话摘要并记录，之后直接读取摘要（由 record_message 实时维护）"""
+    if is_complete(CONVERSATION_SUMMARIES):
+        return
+    name = f"{CONVERSATION_SUMMARIES}:{user_id}"
+    if not is_complete(name):
+        rebuild_conversations(user_id)
+        mark_complete(name)
+
+
+def backfill_conversation_ids(batch_size=1000):
+    """为缺少 conversation_id 的历史消息分批补写会话键，返回更新的消息数"""
+    collection = Message._get_collection()
+    updated = 0
+    while True:
+        batch = list(collection.find(
+            {'conversation_id': None},
+            {'sender': 1, 'receiver': 1}
+        ).limit(batch_size))
+        if not batch:
+            break
+        collection.bulk_write([
+            UpdateOne({'_id': doc['_id']}, {'$set': {
+                'conversation_id': Message.conversation_key(doc['sender'], doc['receiver'])
+            }})
+            for doc in batch
+        ], ordered=False)
+        updated += len(batch)
+        print(f"Backfilled conversation_id for {updated} messages")
+    mark_complete(CONVERSATION_IDS)
+    return updated
+
+
+def _write_summaries(collection, rows):
+    # 只覆盖不比聚合结果更新的摘要；聚合之后又收到新消息的会话因唯一索引冲突而跳过，
+    # 这些会话保留实时写入的最后一条消息，只按消息集合重算未读数
+    operations = [
+        UpdateOne(
+            {'owner': row['_id']['owner'], 'peer': row['_id']['peer'], 'last_timestamp': {'$lte': row['last_timestamp']}},
+            {'$set': {
+                'last_message': row['last_message'],
+                'last_timestamp': row['last_timestamp'],
+                'unread_count': row['unread_count']
+            }},
+            upsert=True
+        )
+        for row in rows
+    ]
+    try:
+        collection.bulk_write(operations, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(error.get('code') != 11000 for error in errors):
+            raise
+        for error in errors:
+            key = rows[error['index']]['_id']
+            collection.update_one({'owner': key['owner'], 'peer': key['peer']}, {'$set': {
+                'unread_count': Message.objects(sender=key['peer'], receiver=key['owner'], read=False).count()
+            }})
+
+
+def backfill_conversation_summaries(batch_size=1000):
+    """用一次聚合从消息集合为所有用户补建会话摘要，返回写入的摘要数：
+    按 (发送者, 接收者) 分组取最后一条消息和未读数，再合并两个方向得到双方各自的摘要"""
+    pipeline = [
+        {'$sort': {'timestamp': -1}},
+        {'$group': {
+            '_id': {'sender': '$sender', 'receiver': '$receiver'},
+            'last_message': {'$first': '$content'},
+            'last_timestamp': {'$first': '$timestamp'},
+            'unread_count': {'$sum': {'$cond': [{'$eq': ['$read', False]}, 1, 0]}}
+        }}
+    ]
+    summaries = {}
+    for row in Message._get_collection().aggregate(pipeline, allowDiskUse=True):
+        sender, receiver = row['_id']['sender'], row['_id']['receiver']
+        for owner, peer in ((sender, receiver), (receiver, sender)):
+            summary = summaries.setdefault((owner, peer), {
+                '_id': {'owner': owner, 'peer': peer}, 'last_timestamp': None, 'unread_count': 0})
+            if summary['last_timestamp'] is None or row['last_timestamp'] > summary['last_timestamp']:
+                summary['last_message'] = row['last_message']
+                summary['last_timestamp'] = row['last_timestamp']
+        summaries[(receiver, sender)]['unread_count'] += row['unread_count']
+
+    collection = Conversation._get_collection()
+    rows = list(summaries.values())
+    for start in range(0, len(rows), batch_size):
+        _write_summaries(collection, rows[start:start + batch_size])
+        print(f"Backfilled {min(start + batch_size, len(rows))} conversation summaries")
+    mark_complete(CONVERSATION_SUMMARIES)
+    return len(rows)
+
+
+def start_conversation_backfill(batch_size=1000):
+    """在后台线程中补写历史消息的会话键和所有用户的会话摘要，不阻塞应用启动"""
+    def run():
+        try:
+            backfill_conversation_ids(batch_size)
+        except Exception as e:
+            print(f"Error backfilling conversation ids: {e}")
+        try:
+            backfill_conversation_summaries(batch_size)
+        except Exception as e:
+            print(f"Error backfilling conversation summaries: {e}")
+
+    thread = threading.Thread(target=run, name='conversation-backfill', daemon=True)
+    thread.start()
+    return thread
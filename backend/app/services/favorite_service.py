@@ -0,0 +1,141 @@
+import datetime
+import threading
+from bson import ObjectId
+from pymongo import UpdateOne
+from pymongo.errors import DuplicateKeyError
+from ..models.favorite_model import Favorite
+from ..models.item_model import Item
+from ..models.user_model import User
+
+# 批量检查收藏状态时一次最多接受的商品数
+CHECK_LIMIT = 100
+
+
+def _adjust_count(item_id, delta):
+    # 同步商品上的收藏计数，用于按收藏数排序；漂移由定期运行的 reconcile_favorite_counts 修正（FAVORITE_COUNTS_RECONCILE_SECONDS）
+    Item._get_collection().update_one({'_id': item_id}, {'$inc': {'favorites_count': delta}})
+
+
+def add_favorite(user_id, item_id):
+    """收藏商品，返回 (收藏记录, 是否新增)；唯一索引保证并发收藏只写入一条"""
+    doc = {'user': ObjectId(str(user_id)), 'item': ObjectId(str(item_id)), 'added_at': datetime.datetime.utcnow()}
+    try:
+        Favorite._get_collection().insert_one(doc)
+    except DuplicateKeyError:
+        existing = Favorite._get_collection().find_one(
+            {'user': doc['user'], 'item': doc['item']}, {'_id': 0, 'item': 1, 'added_at': 1})
+        return existing, False
+    _adjust_count(doc['item'], 1)
+    return doc, True
+
+
+def remove_favorite(user_id, item_id):
+    """取消收藏，返回是否删除了收藏记录"""
+    item_id = ObjectId(str(item_id))
+    result = Favorite._get_collection().delete_one({'user': ObjectId(str(user_id)), 'item': item_id})
+    if result.deleted_count:
+        _adjust_count(item_id, -1)
+    return bool(result.deleted_count)
+
+
+def favorited_ids(user_id, item_ids):
+    """返回 item_ids 中已被用户收藏的商品 ID 集合，只读取 (user, item) 唯一索引"""
+    item_ids = [ObjectId(str(item_id)) for item_id in item_ids if ObjectId.is_valid(str(item_id))]
+    if not item_ids:
+        return set()
+    return {doc['item'] for doc in Favorite._get_collection().find(
+        {'user': ObjectId(str(user_id)), 'item': {'$in': item_ids}},
+        {'_id': 0, 'item': 1}
+    )}
+
+
+def list_favorites(user_id):
+    """按收藏时间倒序返回用户的收藏记录 [{item, added_at}]"""
+    return list(Favorite._get_collection().find(
+        {'user': ObjectId(str(user_id))},
+        {'_id': 0, 'item': 1, 'added_at': 1}
+    ).sort('added_at', -1))
+
+
+def count_favorites(user_id):
+    """用户收藏的商品数"""
+    return Favorite._get_collection().count_documents({'user': ObjectId(str(user_id))})
+
+
+def remove_item_favorites(item_id):
+    """商品删除后清理它的收藏记录"""
+    Favorite._get_collection().delete_many({'item': ObjectId(str(item_id))})
+
+
+def remove_user_favorites(user_id):
+    """用户删除后清理其收藏记录，并扣减对应商品的收藏数"""
+    collection = Favorite._get_collection()
+    user_id = ObjectId(str(user_id))
+    item_ids = [doc['item'] for doc in collection.find({'user': user_id}, {'_id': 0, 'item': 1})]
+    if not item_ids:
+        return
+    collection.delete_many({'user': user_id})
+    Item._get_collection().update_many({'_id': {'$in': item_ids}}, {'$inc': {'favorites_count': -1}})
+
+
+def reconcile_favorite_counts():
+    """用一次聚合按收藏记录重算所有商品的收藏数，返回有收藏的商品数"""
+    items = Item._get_collection()
+    counts = {result['_id']: result['count'] for result in Favorite._get_collection().aggregate([
+        {'$group': {'_id': '$item', 'count': {'$sum': 1}}}
+    ])}
+    operations = [UpdateOne({'_id': item_id}, {'$set': {'favorites_count': count}}) for item_id, count in counts.items()]
+    if operations:
+        items.bulk_write(operations, ordered=False)
+    # 没有收藏的商品（包括缺少该字段的旧数据）统一置 0，保证排序和游标分页的取值一致
+    items.update_many(
+        {'_id': {'$nin': list(counts)}, '$or': [{'favorites_count': {'$ne': 0}}, {'favorites_count': {'$exists': False}}]},
+        {'$set': {'favorites_count': 0}}
+    )
+    return len(counts)
+
+
+def migrate_embedded_favorites(batch_size=500):
+    """将用户文档中内嵌的 favorites 分批迁移到收藏集合并从用户文档中移除，返回迁移的用户数"""
+    users = User._get_collection()
+    favorites = Favorite._get_collection()
+    migrated = 0
+    while True:
+        batch = list(users.find(
+            {'favorites.0': {'$exists': True}},
+            {'favorites': 1}
+        ).limit(batch_size))
+        if not batch:
+            break
+        operations = []
+        for doc in batch:
+            for entry in doc['favorites']:
+                item_id = entry.get('item_id')
+                if not item_id or not ObjectId.is_valid(item_id):
+                    continue
+                # 已经在收藏集合中的记录保持原样
+                operations.append(UpdateOne(
+                    {'user': doc['_id'], 'item': ObjectId(item_id)},
+                    {'$setOnInsert': {'added_at': entry.get('added_at') or datetime.datetime.utcnow()}},
+                    upsert=True
+                ))
+        if operations:
+            favorites.bulk_write(operations, ordered=False)
+        users.update_many({'_id': {'$in': [doc['_id'] for doc in batch]}}, {'$set': {'favorites': []}})
+        migrated += len(batch)
+        print(f"Migrated favorites for {migrated} users")
+    return migrated
+
+
+def start_favorite_migration(batch_size=500):
+    """在后台线程中迁移内嵌的收藏列表，完成后重算商品收藏数，不阻塞应用启动"""
+    def run():
+        try:
+            migrate_embedded_favorites(batch_size)
+            reconcile_favorite_counts()
+        except Exception as e:
+            print(f"Error migrating favorites: {e}")
+
+    thread = threading.Thread(target=run, name='favorites-migration', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,71 @@
+import threading
+
+
+def reconcile_indexes(document, drop_obsolete=False):
+    """对比模型声明的索引与数据库中的实际索引：创建缺失的索引，可选删除多余的索引"""
+    collection = document._get_collection()
+    diff = document.compare_indexes()
+    missing = [spec for spec in diff['missing'] if spec != [('_id', 1)]]
+    if missing:
+        document.ensure_indexes()
+        print(f"Created {len(missing)} index(es) on {collection.name}: {missing}")
+
+    extra = diff['extra']
+    if extra and drop_obsolete:
+        for name, info in collection.index_information().items():
+            if name != '_id_' and [tuple(k) for k in info['key']] in extra:
+                collection.drop_index(name)
+                print(f"Dropped obsolete index {name} on {collection.name}")
+    elif extra:
+        print(f"Obsolete index(es) on {collection.name} (set INDEX_DROP_OBSOLETE=true to drop): {extra}")
+    return {'missing': missing, 'extra': extra}
+
+
+def start_index_reconciliation(app, documents):
+    """在后台线程中校对索引，不阻塞应用启动"""
+    drop_obsolete = app.config.get('INDEX_DROP_OBSOLETE', False)
+
+    def run():
+        for document in documents:
+            try:
+                reconcile_indexes(document, drop_obsolete)
+            except Exception as e:
+                print(f"Error reconciling indexes for {document.__name__}: {e}")
+
+    thread = threading.Thread(target=run, name='index-reconciliation', daemon=True)
+    thread.start()
+    return thread
+
+
+def _plan_stages(plan):
+    # 递归收集查询计划中的所有阶段名称
+    if not isinstance(plan, dict):
+        return []
+    stages = [plan['stage']] if 'stage' in plan else []
+    for key in ('inputStage', 'queryPlan', 'winningPlan'):
+        stages.extend(_plan_stages(plan.get(key)))
+    for child in plan.get('inputStages', []):
+        stages.extend(_plan_stages(child))
+    return stages
+
+
+def explain_listing_queries(limit=12):
+    """对 get_items 的各种查询形态执行 explain，返回 [(查询描述, 阶段列表, 是否合格)]；
+    出现 COLLSCAN 或内存排序 SORT 阶段视为不合格"""
+    from ..models.item_model import Item
+    from ..routes.item_routes import SORT_ORDERS
+
+    filters = {
+        'status': {'status': 'available'},
+        'status+category': {'status': 'available', 'category': 'electronics'},
+        'status+price': {'status': 'available', 'price': {'$gte': 10.0, '$lte': 500.0}},
+        'status+category+price': {'status': 'available', 'category': 'electronics', 'price': {'$gte': 10.0}},
+    }
+    results = []
+    for filter_name, query in filters.items():
+        for sort_name, order in SORT_ORDERS.items():
+            plan = Item.objects(__raw__=query).order_by(*order).limit(limit).explain()
+            stages = _plan_stages(plan.get('queryPlanner', {}).get('winningPlan'))
+            ok = 'COLLSCAN' not in stages and 'SORT' not in stages
+            results.append((f"{filter_name} sort={sort_name}", stages, ok))
+    return results
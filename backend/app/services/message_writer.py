@@ -0,0 +1,137 @@
+import atexit
+import queue
+import threading
+from pymongo.errors import BulkWriteError
+from ..models.message_model import Message
+from .conversation_service import record_messages
+
+
+class MessageQueueFull(Exception):
+    """写入队列已满（背压），调用方应提示客户端稍后重试"""
+
+
+class MessageWriter:
+    """聊天消息的写入管道：同步模式下直接写入；异步模式下消息在进程内分配 ObjectId 后立即推送，
+    由后台任务从有界队列中批量 insert_many 写入数据库"""
+
+    def __init__(self):
+        self.ack_after_write = True  # False 表示入队即确认，进程崩溃时可能丢失尚未写入的消息
+        self.batch_size = 200
+        self.enqueue_timeout = 1.0
+        self._queue = None
+        self._lock = threading.Lock()
+        self._stats = {'enqueued': 0, 'persisted': 0, 'duplicates': 0, 'failed': 0, 'rejected': 0, 'batches': 0}
+
+    def init_app(self, app, socketio=None):
+        """读取配置；异步模式下创建有界队列并启动后台写入任务"""
+        self.ack_after_write = app.config.get('MESSAGE_WRITE_ACK', 'write') != 'enqueue'
+        self.batch_size = app.config.get('MESSAGE_BATCH_SIZE', 200)
+        self.enqueue_timeout = app.config.get('MESSAGE_ENQUEUE_TIMEOUT', 1.0)
+        if app.config.get('MESSAGE_WRITE_MODE', 'sync') != 'async' or self._queue is not None:
+            return
+        self._queue = queue.Queue(maxsize=app.config.get('MESSAGE_QUEUE_SIZE', 10000))
+        if socketio is not None:
+            socketio.start_background_task(self._run)
+        else:
+            threading.Thread(target=self._run, name='message-writer', daemon=True).start()
+        atexit.register(self.flush)
+
+    @property
+    def asynchronous(self):
+        return self._queue is not None
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._stats[name] += value
+
+    def submit(self, message, callback=None):
+        """保存一条已分配 id 的消息，callback(ok) 在写入数据库后调用。
+        同步模式下立即写入；异步模式下入队后立即返回，队列已满时最多等待 enqueue_timeout 秒，
+        仍无法入队则抛出 MessageQueueFull"""
+        message.validate()  # 同时生成 conversation_id
+        entry = (message.to_mongo().to_dict(), callback)
+        if self._queue is None:
+            self._write([entry])
+            return
+        try:
+            self._queue.put(entry, timeout=self.enqueue_timeout)
+        except queue.Full:
+            self._count('rejected')
+            raise MessageQueueFull('Message queue is full')
+        self._count('enqueued')
+
+    def _write(self, entries):
+        docs = [doc for doc, _ in entries]
+        failed = set()
+        duplicates = set()
+        try:
+            Message._get_collection().insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            # 重复的 _id 说明消息已经写入过（会话摘要也已更新），其余错误的消息记为失败
+            for error in e.details.get('writeErrors', []):
+                (duplicates if error.get('code') == 11000 else failed).add(error['index'])
+        except Exception as e:
+            print(f"Error persisting messages: {e}")
+            failed = set(range(len(docs)))
+
+        # 只有本次新写入的消息才更新会话摘要和未读数
+        persisted = [doc for i, doc in enumerate(docs) if i not in failed and i not in duplicates]
+        try:
+            record_messages(persisted)
+        except Exception as e:
+            print(f"Error updating conversation summaries: {e}")
+        self._count('batches')
+        self._count('persisted', len(persisted))
+        self._count('duplicates', len(duplicates))
+        self._count('failed', len(failed))
+
+        for i, (_, callback) in enumerate(entries):
+            if callback is None:
+                continue
+            try:
+                callback(i not in failed)
+            except Exception as e:
+                print(f"Message write callback error: {e}")
+        return len(persisted)
+
+    def _next_batch(self, block):
+        # 阻塞等待第一条消息，然后把队列中已有的消息一并取出（最多 batch_size 条）
+        try:
+            batch = [self._queue.get(timeout=1.0) if block else self._queue.get_nowait()]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """同步写入队列中剩余的消息，返回写入的数量（进程退出时调用）"""
+        if self._queue is None:
+            return 0
+        written = 0
+        while True:
+            batch = self._next_batch(block=False)
+            if not batch:
+                return written
+            written += self._write(batch)
+
+    def _run(self):
+        while True:
+            batch = self._next_batch(block=True)
+            if batch:
+                self._write(batch)
+
+    def stats(self):
+        """返回写入统计和当前队列深度"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['mode'] = 'async' if self._queue is not None else 'sync'
+        stats['ack'] = 'write' if self.ack_after_write else 'enqueue'
+        stats['queue_depth'] = self._queue.qsize() if self._queue is not None else 0
+        return stats
+
+
+message_writer = MessageWriter()
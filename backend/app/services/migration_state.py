@@ -0,0 +1,25 @@
+import datetime
+from ..models.migration_model import MigrationState
+
+# 已确认完成的迁移；完成标记不会被撤销，确认后不再查询数据库
+_completed = set()
+
+
+def is_complete(name):
+    """迁移是否已经完成（所有进程共享同一个标记）"""
+    if name in _completed:
+        return True
+    if MigrationState._get_collection().find_one({'name': name}, {'_id': 1}):
+        _completed.add(name)
+        return True
+    return False
+
+
+def mark_complete(name):
+    """记录迁移已完成"""
+    MigrationState._get_collection().update_one(
+        {'name': name},
+        {'$setOnInsert': {'completed_at': datetime.datetime.utcnow()}},
+        upsert=True
+    )
+    _completed.add(name)
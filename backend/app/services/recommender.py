@@ -0,0 +1,203 @@
+import datetime
+import heapq
+import math
+import threading
+import time
+from collections import defaultdict
+from bson import ObjectId
+from pymongo import UpdateOne
+
+try:
+    import numpy as np  # 可选依赖：安装 numpy 和 scipy 后用稀疏矩阵计算相似度
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+# 行为权重：收藏比浏览更能说明兴趣
+VIEW_WEIGHT = 1.0
+FAVORITE_WEIGHT = 3.0
+
+
+def load_interactions():
+    """读取用户的浏览和收藏记录，返回 {用户ID: {商品ID: 权重}}"""
+    from ..models.browse_history_model import BrowseHistory
+    from ..models.favorite_model import Favorite
+
+    interactions = defaultdict(dict)
+    for doc in BrowseHistory._get_collection().find({}, {'_id': 0, 'user': 1, 'item': 1}):
+        interactions[doc['user']][doc['item']] = VIEW_WEIGHT
+    for doc in Favorite._get_collection().find({}, {'_id': 0, 'user': 1, 'item': 1}):
+        weights = interactions[doc['user']]
+        weights[doc['item']] = weights.get(doc['item'], 0.0) + FAVORITE_WEIGHT
+    return dict(interactions)
+
+
+def load_candidates():
+    """读取可推荐（status='available'）的商品，返回 {商品ID: (卖家ID, 展示字段)}"""
+    from ..models.item_model import Item
+
+    candidates = {}
+    for doc in Item.objects(status='available').only('title', 'price', 'category', 'images', 'seller').as_pymongo():
+        images = doc.get('images') or []
+        candidates[doc['_id']] = (doc.get('seller'), {
+            'item': doc['_id'],
+            'title': doc.get('title'),
+            'price': doc.get('price'),
+            'category': doc.get('category'),
+            'image': images[0] if images else None
+        })
+    return candidates
+
+
+def _scores_sparse(interactions, candidates):
+    # 用户 × 商品 的行为矩阵 M，商品相似度为 MᵀM 的余弦归一化，用户得分为 M · 相似度
+    users = list(interactions)
+    columns = {}
+    rows, cols, values = [], [], []
+    for row, user in enumerate(users):
+        for item_id, weight in interactions[user].items():
+            rows.append(row)
+            cols.append(columns.setdefault(item_id, len(columns)))
+            values.append(weight)
+    items = list(columns)
+    matrix = sparse.csr_matrix((values, (rows, cols)), shape=(len(users), len(items)))
+
+    cooccurrence = (matrix.T @ matrix).tocsr()
+    norms = np.sqrt(cooccurrence.diagonal())
+    norms[norms == 0] = 1.0
+    cooccurrence.setdiag(0)
+    cooccurrence.eliminate_zeros()
+    inverse = sparse.diags(1.0 / norms)
+    eligible = sparse.diags(np.array([1.0 if item_id in candidates else 0.0 for item_id in items]))
+    similarity = inverse @ cooccurrence @ inverse @ eligible
+
+    scores = (matrix @ similarity).tocsr()
+    for row, user in enumerate(users):
+        start, end = scores.indptr[row], scores.indptr[row + 1]
+        yield user, {items[col]: float(score) for col, score in zip(scores.indices[start:end], scores.data[start:end])}
+
+
+def _scores_python(interactions, candidates):
+    # 没有 numpy/scipy 时用字典计算同样的余弦相似度
+    cooccurrence = defaultdict(lambda: defaultdict(float))
+    norms = defaultdict(float)
+    for weights in interactions.values():
+        for i, wi in weights.items():
+            norms[i] += wi * wi
+            for j, wj in weights.items():
+                if i != j:
+                    cooccurrence[i][j] += wi * wj
+    for user, weights in interactions.items():
+        scores = defaultdict(float)
+        for i, wi in weights.items():
+            for j, count in cooccurrence[i].items():
+                if j in candidates:
+                    scores[j] += wi * count / math.sqrt(norms[i] * norms[j])
+        yield user, scores
+
+
+class Recommender:
+    """“看了又看”推荐：离线计算商品之间的共同浏览/共同收藏相似度，为每个用户预先生成 top-K 推荐表，
+    接口只需按用户读取一条记录。相似度不是增量更新的：每隔 RECOMMENDATION_REFRESH_SECONDS 从全部浏览和收藏记录
+    完整重算一次（只写入发生变化的推荐列表）；两次重算之间只同步商品下架、删除和展示字段的修改"""
+
+    def __init__(self):
+        self.top_k = 20
+        self.refresh_seconds = 3600
+        self._lock = threading.Lock()
+        self.last_build = None
+
+    def init_app(self, app):
+        """读取配置"""
+        self.top_k = app.config.get('RECOMMENDATION_TOP_K', 20)
+        self.refresh_seconds = app.config.get('RECOMMENDATION_REFRESH_SECONDS', 3600)
+
+    @property
+    def engine(self):
+        return 'scipy' if sparse is not None else 'python'
+
+    def compute(self):
+        """计算全部用户的推荐列表，返回 {用户ID: [展示字段 + score]}；已浏览/收藏过的商品和用户自己的商品不推荐"""
+        interactions = load_interactions()
+        candidates = load_candidates()
+        if not interactions or not candidates:
+            return {}
+        scorer = _scores_sparse if sparse is not None else _scores_python
+        results = {}
+        for user, scores in scorer(interactions, candidates):
+            seen = interactions[user]
+            ranked = heapq.nlargest(self.top_k, (
+                (score, item_id) for item_id, score in scores.items()
+                if score > 0 and item_id not in seen and candidates[item_id][0] != user
+            ))
+            if ranked:
+                results[user] = [dict(candidates[item_id][1], score=round(score, 4)) for score, item_id in ranked]
+        return results
+
+    def rebuild(self):
+        """从全部浏览和收藏记录完整重算推荐表，只写入发生变化的推荐列表，返回统计信息"""
+        from ..models.recommendation_model import Recommendation
+
+        with self._lock:
+            started = time.monotonic()
+            results = self.compute()
+            collection = Recommendation._get_collection()
+            existing = {
+                doc['user']: [entry.get('item') for entry in doc.get('items', [])]
+                for doc in collection.find({}, {'user': 1, 'items.item': 1})
+            }
+            now = datetime.datetime.utcnow()
+            operations = [
+                UpdateOne({'user': user}, {'$set': {'items': items, 'updated_at': now}}, upsert=True)
+                for user, items in results.items()
+                if existing.get(user) != [entry['item'] for entry in items]
+            ]
+            if operations:
+                collection.bulk_write(operations, ordered=False)
+            stale = [user for user in existing if user not in results]
+            if stale:
+                collection.delete_many({'user': {'$in': stale}})
+            self.last_build = now
+            stats = {
+                'engine': self.engine,
+                'users': len(results),
+                'written': len(operations),
+                'removed': len(stale),
+                'seconds': round(time.monotonic() - started, 3)
+            }
+        print(f"Recommendations rebuilt: {stats}")
+        return stats
+
+    def discard_item(self, item_id):
+        """商品删除或不再可购买时，从所有推荐列表中移除"""
+        from ..models.recommendation_model import Recommendation
+
+        item_id = ObjectId(str(item_id))
+        Recommendation._get_collection().update_many(
+            {'items.item': item_id}, {'$pull': {'items': {'item': item_id}}})
+
+    def refresh_item(self, item):
+        """商品修改后同步推荐表中冗余的展示字段"""
+        from ..models.recommendation_model import Recommendation
+
+        if item.status != 'available':
+            self.discard_item(item.id)
+            return
+        Recommendation._get_collection().update_many({'items.item': item.id}, {'$set': {
+            'items.$.title': item.title,
+            'items.$.price': item.price,
+            'items.$.category': item.category,
+            'items.$.image': item.images[0] if item.images else None
+        }})
+
+    def recommend(self, user_id, limit=10):
+        """读取用户的推荐列表，没有预计算结果时返回 None"""
+        from ..models.recommendation_model import Recommendation
+
+        doc = Recommendation.objects(user=user_id).only('items').as_pymongo().first()
+        if doc is None:
+            return None
+        return doc.get('items', [])[:limit]
+
+
+recommender = Recommender()
@@ -0,0 +1,179 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from urllib.parse import urlencode
+import redis
+from flask import request, make_response, Response
+
+
+class MemoryBackend:
+    """进程内 LRU 缓存，支持 TTL 和标签失效"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # 缓存键 -> (过期时间, 值, 标签)
+        self._tags = {}                # 标签 -> 缓存键集合
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                self._discard(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, tags, ttl):
+        with self._lock:
+            self._discard(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._discard(key)
+
+
+class RedisBackend:
+    """基于 Redis 的缓存，多个进程共享；标签用集合记录对应的缓存键"""
+
+    KEY_PREFIX = 'cache:'
+    TAG_PREFIX = 'cache-tag:'
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        return self.client.get(self.KEY_PREFIX + key)
+
+    def set(self, key, value, tags, ttl):
+        pipe = self.client.pipeline()
+        pipe.setex(self.KEY_PREFIX + key, ttl, value)
+        for tag in tags:
+            pipe.sadd(self.TAG_PREFIX + tag, key)
+            pipe.expire(self.TAG_PREFIX + tag, ttl)
+        pipe.execute()
+
+    def invalidate(self, tags):
+        for tag in tags:
+            keys = self.client.smembers(self.TAG_PREFIX + tag)
+            pipe = self.client.pipeline()
+            for key in keys:
+                pipe.delete(self.KEY_PREFIX + key.decode())
+            pipe.delete(self.TAG_PREFIX + tag)
+            pipe.execute()
+
+
+class ResponseCache:
+    """公共 GET 接口的响应缓存"""
+
+    def __init__(self):
+        self.backend = None
+        self.default_ttl = 30
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'sets': 0, 'invalidations': 0, 'errors': 0}
+
+    def init_app(self, app, redis_client=None):
+        """根据配置选择缓存后端"""
+        self.default_ttl = app.config.get('RESPONSE_CACHE_TTL', 30)
+        backend = app.config.get('RESPONSE_CACHE_BACKEND', 'memory')
+        if backend == 'redis' and redis_client is not None:
+            self.backend = RedisBackend(redis_client)
+        elif backend == 'memory':
+            self.backend = MemoryBackend(app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+        else:
+            self.backend = None  # 关闭缓存
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def stats(self):
+        """返回命中率等统计信息"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['backend'] = type(self.backend).__name__ if self.backend else None
+        return stats
+
+    def invalidate(self, *tags):
+        """使带有任一标签的缓存失效"""
+        if self.backend is None or not tags:
+            return
+        try:
+            self.backend.invalidate(tags)
+            self._count('invalidations')
+        except redis.exceptions.RedisError as e:
+            self._count('errors')
+            print(f"Response cache invalidation error: {e}")
+
+    def cached(self, namespace, tags=None, ttl=None):
+        """缓存视图的 200 响应；缓存键由视图参数和排序后的查询参数组成，
+        tags 为 (视图参数, 查询参数) -> 标签列表 的函数"""
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                if self.backend is None:
+                    return fn(*args, **kwargs)
+
+                query = urlencode(sorted(request.args.items(multi=True)))
+                key = f"{namespace}:{json.dumps(kwargs, sort_keys=True)}:{query}"
+                try:
+                    body = self.backend.get(key)
+                except redis.exceptions.RedisError as e:
+                    self._count('errors')
+                    print(f"Response cache read error: {e}")
+                    body = None
+
+                if body is not None:
+                    self._count('hits')
+                    response = Response(body, 200, mimetype='application/json')
+                    response.headers['X-Cache'] = 'HIT'
+                    return response
+
+                self._count('misses')
+                response = make_response(fn(*args, **kwargs))
+                if response.status_code == 200:
+                    entry_tags = tags(kwargs, request.args) if tags else []
+                    try:
+                        self.backend.set(key, response.get_data(), entry_tags, ttl or self.default_ttl)
+                        self._count('sets')
+                    except redis.exceptions.RedisError as e:
+                        self._count('errors')
+                        print(f"Response cache write error: {e}")
+                response.headers['X-Cache'] = 'MISS'
+                return response
+            return wrapper
+        return decorator
+
+
+def invalidate_item(item_id, *categories):
+    """商品写操作后使相关缓存失效：商品详情、所属分类列表、全部商品列表和分类统计"""
+    tags = [f"item:{item_id}", 'items:all', 'category_stats']
+    tags.extend(f"category:{category}" for category in categories if category)
+    response_cache.invalidate(*tags)
+
+
+response_cache = ResponseCache()
@@ -0,0 +1,230 @@
+import bisect
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter
+
+try:
+    import jieba  # 可选依赖：安装后使用 jieba 搜索引擎模式分词
+except ImportError:
+    jieba = None
+
+# 匹配连续的中日韩文字，或连续的字母数字
+_TOKEN_RE = re.compile(r'[一-鿿㐀-䶿]+|[a-z0-9]+')
+_CJK_RE = re.compile(r'[一-鿿㐀-䶿]')
+
+# 标题命中的权重高于描述
+TITLE_WEIGHT = 2
+# BM25 参数
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+
+def tokenize(text):
+    """将文本切分为检索词，支持中文"""
+    if not text:
+        return []
+    text = text.lower()
+    if jieba is not None:
+        return [t for t in (w.strip() for w in jieba.lcut_for_search(text)) if _TOKEN_RE.fullmatch(t)]
+
+    # 没有 jieba 时：中文按单字 + 二元组切分，英文和数字按单词切分
+    tokens = []
+    for run in _TOKEN_RE.findall(text):
+        if _CJK_RE.match(run):
+            tokens.extend(run)
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+        else:
+            tokens.append(run)
+    return tokens
+
+
+# 查询词没有完全匹配的检索词时，按以该查询词开头的检索词做前缀匹配（例如 “苹” 匹配 “苹果”、“mac” 匹配 “macbook”）；
+# 前缀匹配的得分打折，且最多扩展这么多个检索词
+PARTIAL_MATCH_WEIGHT = 0.5
+MAX_PARTIAL_TERMS = 50
+# 一次检索最多返回的商品数（按得分取前若干个），限制后续 $in 查询的大小
+MAX_SEARCH_RESULTS = 1000
+
+
+class _Postings:
+    """一份完整的倒排索引数据，重建时在锁外构造新的实例再整体替换"""
+
+    def __init__(self):
+        self.postings = {}    # 检索词 -> {商品ID: 词频}
+        self.doc_terms = {}   # 商品ID -> Counter(检索词)，用于更新和删除
+        self.doc_len = {}     # 商品ID -> 加权文档长度
+        self.total_len = 0
+        self.sorted_terms = None  # 排序后的检索词表，用于前缀查找；首次需要时构建，之后随增删维护
+
+    def remove(self, item_id):
+        terms = self.doc_terms.pop(item_id, None)
+        if terms is None:
+            return
+        for token in terms:
+            postings = self.postings.get(token)
+            if postings is not None:
+                postings.pop(item_id, None)
+                if not postings:
+                    del self.postings[token]
+                    if self.sorted_terms is not None:
+                        del self.sorted_terms[bisect.bisect_left(self.sorted_terms, token)]
+        self.total_len -= self.doc_len.pop(item_id, 0)
+
+    def add(self, item_id, title, description):
+        terms = Counter()
+        for token in tokenize(title):
+            terms[token] += TITLE_WEIGHT
+        for token in tokenize(description):
+            terms[token] += 1
+        self.doc_terms[item_id] = terms
+        for token, tf in terms.items():
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = self.postings[token] = {}
+                if self.sorted_terms is not None:
+                    bisect.insort(self.sorted_terms, token)
+            postings[item_id] = tf
+        length = sum(terms.values())
+        self.doc_len[item_id] = length
+        self.total_len += length
+
+    def matching_terms(self, token):
+        """查询词对应的 [(检索词, 权重)]：优先完全匹配，否则在排序的检索词表中二分查找前缀匹配"""
+        if token in self.postings:
+            return [(token, 1.0)]
+        if self.sorted_terms is None:
+            self.sorted_terms = sorted(self.postings)
+        partial = []
+        i = bisect.bisect_left(self.sorted_terms, token)
+        while i < len(self.sorted_terms) and len(partial) < MAX_PARTIAL_TERMS:
+            term = self.sorted_terms[i]
+            if not term.startswith(token):
+                break
+            partial.append((term, PARTIAL_MATCH_WEIGHT))
+            i += 1
+        return partial
+
+
+class SearchIndex:
+    """商品标题/描述的进程内倒排索引，使用 BM25 计算相关度"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()  # 同一时间只进行一次全量重建
+        self._index = _Postings()
+        self._journal = None   # 重建期间的增量修改，重建完成后重放到新索引上
+        self._built_at = None
+        self.refresh_seconds = 300
+
+    def init_app(self, app):
+        """从应用配置中读取索引刷新间隔"""
+        self.refresh_seconds = app.config.get('SEARCH_INDEX_REFRESH_SECONDS', 300)
+
+    def _apply(self, op, item_id, title=None, description=None):
+        # 在锁内调用：修改当前索引，重建进行中时同时记录下来
+        if self._journal is not None:
+            self._journal.append((op, item_id, title, description))
+        self._index.remove(item_id)
+        if op == 'add':
+            self._index.add(item_id, title, description)
+
+    def add_item(self, item):
+        """新增或更新商品的索引条目"""
+        with self._lock:
+            if self._built_at is None and self._journal is None:
+                return  # 索引尚未构建，首次检索时会全量加载
+            self._apply('add', str(item.id), item.title, item.description)
+
+    def remove_item(self, item_id):
+        """从索引中删除商品"""
+        with self._lock:
+            self._apply('remove', str(item_id))
+
+    def rebuild(self):
+        """从数据库全量重建索引：在锁外构造新索引，期间的检索继续使用旧索引，完成后整体替换"""
+        with self._build_lock:
+            self._rebuild()
+
+    def _rebuild(self):
+        # 调用方持有 _build_lock
+        from ..models.item_model import Item
+
+        with self._lock:
+            self._journal = []
+        try:
+            index = _Postings()
+            for doc in Item._get_collection().find({}, {'title': 1, 'description': 1}):
+                index.add(str(doc['_id']), doc.get('title'), doc.get('description'))
+            with self._lock:
+                # 重放重建期间的修改，避免被读取时刻较早的数据覆盖
+                for op, item_id, title, description in self._journal:
+                    index.remove(item_id)
+                    if op == 'add':
+                        index.add(item_id, title, description)
+                self._index = index
+                self._built_at = time.monotonic()
+        finally:
+            with self._lock:
+                self._journal = None
+        print(f"Search index built with {len(index.doc_len)} items")
+
+    def _refresh_in_background(self):
+        def run():
+            try:
+                self._rebuild()
+            except Exception as e:
+                print(f"Error rebuilding search index: {e}")
+            finally:
+                self._build_lock.release()
+
+        # 已有重建在进行时直接返回
+        if self._build_lock.acquire(blocking=False):
+            threading.Thread(target=run, name='search-index-rebuild', daemon=True).start()
+
+    def _ensure_built(self):
+        # 首次检索时必须等待构建完成；之后索引过期（多进程部署时各进程的索引相互独立，需定期修正漂移）
+        # 只在后台重建，检索继续使用旧索引
+        if self._built_at is None:
+            with self._build_lock:
+                if self._built_at is None:
+                    self._rebuild()
+        elif time.monotonic() - self._built_at > self.refresh_seconds:
+            self._refresh_in_background()
+
+    def search(self, query, limit=MAX_SEARCH_RESULTS):
+        """返回同时命中全部查询词的商品，按 BM25 得分降序排列的前 limit 个 (商品ID, 得分)"""
+        tokens = set(tokenize(query))
+        if not tokens:
+            return []
+
+        self._ensure_built()
+        with self._lock:
+            index = self._index
+            n_docs = len(index.doc_len)
+            if not n_docs:
+                return []
+            avg_len = index.total_len / n_docs
+            scores = {}
+            candidates = None
+            for token in tokens:
+                token_scores = {}
+                for term, weight in index.matching_terms(token):
+                    postings = index.postings[term]
+                    idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+                    for item_id, tf in postings.items():
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * index.doc_len[item_id] / avg_len)
+                        token_scores[item_id] = token_scores.get(item_id, 0.0) + weight * idf * tf * (BM25_K1 + 1) / (tf + norm)
+                # 关键词作为筛选条件：每个查询词都必须命中（完全匹配或前缀匹配）
+                candidates = set(token_scores) if candidates is None else candidates & token_scores.keys()
+                if not candidates:
+                    return []
+                for item_id, score in token_scores.items():
+                    scores[item_id] = scores.get(item_id, 0.0) + score
+
+        return heapq.nlargest(limit, ((item_id, scores[item_id]) for item_id in candidates), key=lambda pair: pair[1])
+
+
+search_index = SearchIndex()
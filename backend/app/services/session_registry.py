@@ -0,0 +1,128 @@
+import threading
+import time
+import redis
+
+
+class SessionRegistry:
+    """Socket.IO 会话登记表：同时维护 用户 -> 会话集合 和 会话 -> 用户 两个索引，
+    所有查询均为 O(1)，一个用户可以在多个设备上同时在线"""
+
+    PRESENCE_PREFIX = 'presence:'
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._user_sids = {}  # 用户ID -> 会话ID集合
+        self._sid_user = {}   # 会话ID -> 用户ID
+        self._peak_sessions = 0
+        self._total_authenticated = 0
+        self._redis = None  # 集群模式下的共享在线状态
+        self.presence_ttl = 60
+
+    def init_app(self, app, redis_client=None, socketio=None):
+        """集群模式下使用 Redis 共享在线状态，并启动心跳任务续期本进程的会话"""
+        if not app.config.get('REALTIME_CLUSTERED') or redis_client is None:
+            return
+        self._redis = redis_client
+        self.presence_ttl = app.config.get('PRESENCE_TTL_SECONDS', 60)
+        if socketio is not None:
+            socketio.start_background_task(self._heartbeat, socketio)
+
+    def _presence_touch(self, user_id, sids):
+        # 在线状态存为 ZSET：成员为会话ID，分数为过期时间；进程退出后未续期的会话自然过期
+        if self._redis is None or not sids:
+            return
+        key = self.PRESENCE_PREFIX + user_id
+        expires_at = time.time() + self.presence_ttl
+        try:
+            pipe = self._redis.pipeline()
+            pipe.zadd(key, {sid: expires_at for sid in sids})
+            pipe.expire(key, self.presence_ttl)
+            pipe.execute()
+        except redis.exceptions.RedisError as e:
+            print(f"Presence update error: {e}")
+
+    def _presence_remove(self, user_id, sid):
+        if self._redis is None:
+            return
+        try:
+            self._redis.zrem(self.PRESENCE_PREFIX + user_id, sid)
+        except redis.exceptions.RedisError as e:
+            print(f"Presence update error: {e}")
+
+    def _heartbeat(self, socketio):
+        while True:
+            socketio.sleep(self.presence_ttl / 3)
+            with self._lock:
+                snapshot = {user_id: set(sids) for user_id, sids in self._user_sids.items()}
+            for user_id, sids in snapshot.items():
+                self._presence_touch(user_id, sids)
+
+    def add(self, user_id, sid):
+        """登记会话，返回该用户此前是否离线"""
+        with self._lock:
+            previous = self._sid_user.get(sid)
+            if previous is not None and previous != user_id:
+                self._discard(sid, previous)
+            sids = self._user_sids.setdefault(user_id, set())
+            was_offline = not sids
+            if sid not in sids:
+                sids.add(sid)
+                self._sid_user[sid] = user_id
+                self._total_authenticated += 1
+                self._peak_sessions = max(self._peak_sessions, len(self._sid_user))
+        self._presence_touch(user_id, [sid])
+        return was_offline
+
+    def _discard(self, sid, user_id):
+        self._sid_user.pop(sid, None)
+        sids = self._user_sids.get(user_id)
+        if sids is not None:
+            sids.discard(sid)
+            if not sids:
+                del self._user_sids[user_id]
+
+    def remove(self, sid):
+        """注销会话，返回 (用户ID, 该用户是否已全部下线)；未登记的会话返回 (None, False)"""
+        with self._lock:
+            user_id = self._sid_user.get(sid)
+            if user_id is None:
+                return None, False
+            self._discard(sid, user_id)
+            all_offline = user_id not in self._user_sids
+        self._presence_remove(user_id, sid)
+        return user_id, all_offline
+
+    def user_for(self, sid):
+        """返回会话对应的用户ID"""
+        return self._sid_user.get(sid)
+
+    def sids_for(self, user_id):
+        """返回用户当前的全部会话ID"""
+        with self._lock:
+            return set(self._user_sids.get(user_id, ()))
+
+    def is_online(self, user_id):
+        """用户是否至少有一个在线会话；集群模式下包括其他进程上的会话"""
+        if user_id in self._user_sids:
+            return True
+        if self._redis is None:
+            return False
+        try:
+            return self._redis.zcount(self.PRESENCE_PREFIX + user_id, time.time(), '+inf') > 0
+        except redis.exceptions.RedisError as e:
+            print(f"Presence lookup error: {e}")
+            return True  # 无法确定时照常投递，房间内没有会话也不会出错
+
+    def metrics(self):
+        """返回连接数统计"""
+        with self._lock:
+            return {
+                'online_users': len(self._user_sids),
+                'sessions': len(self._sid_user),
+                'peak_sessions': self._peak_sessions,
+                'total_authenticated': self._total_authenticated,
+                'multi_device_users': sum(1 for sids in self._user_sids.values() if len(sids) > 1)
+            }
+
+
+session_registry = SessionRegistry()
@@ -0,0 +1,69 @@
+import threading
+import time
+
+
+class TypingThrottle:
+    """“正在输入”通知的限流与合并：同一对 (发送者, 接收者) 每 interval 秒最多推送一次 user_typing，
+    期间的输入事件只延长状态；超过 idle 秒没有新的输入事件时自动推送 stopped_typing"""
+
+    def __init__(self):
+        self.interval = 2.0
+        self.idle = 3.0
+        self._lock = threading.Lock()
+        self._pairs = {}  # (发送者ID, 接收者ID) -> [上次推送时间, 最后一次输入时间]
+        self._started = False
+        self._stats = {'received': 0, 'emitted': 0, 'stopped': 0}
+
+    def init_app(self, app, socketio):
+        """读取配置并启动清理任务"""
+        self.interval = app.config.get('TYPING_THROTTLE_SECONDS', 2.0)
+        self.idle = app.config.get('TYPING_IDLE_SECONDS', 3.0)
+        if not self._started:
+            self._started = True
+            socketio.start_background_task(self._sweep, socketio)
+
+    def typing(self, sender_id, receiver_id):
+        """记录一次输入事件，返回本次是否需要推送 user_typing"""
+        now = time.monotonic()
+        key = (sender_id, receiver_id)
+        with self._lock:
+            self._stats['received'] += 1
+            state = self._pairs.get(key)
+            if state is not None and now - state[0] < self.interval:
+                state[1] = now
+                return False
+            self._pairs[key] = [now, now]
+            self._stats['emitted'] += 1
+            return True
+
+    def reset(self, sender_id, receiver_id):
+        """发送者发出消息后结束输入状态，返回此前是否处于输入状态"""
+        with self._lock:
+            return self._pairs.pop((sender_id, receiver_id), None) is not None
+
+    def _expire(self):
+        # 取出空闲超时的输入状态
+        deadline = time.monotonic() - self.idle
+        with self._lock:
+            expired = [key for key, state in self._pairs.items() if state[1] < deadline]
+            for key in expired:
+                del self._pairs[key]
+            self._stats['stopped'] += len(expired)
+        return expired
+
+    def _sweep(self, socketio):
+        while True:
+            socketio.sleep(min(self.idle, self.interval) / 2)
+            for sender_id, receiver_id in self._expire():
+                socketio.emit('stopped_typing', {'sender_id': sender_id}, room=receiver_id)
+
+    def stats(self):
+        """返回输入事件的接收数、推送数和当前输入中的会话数"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['active_pairs'] = len(self._pairs)
+        stats['suppressed'] = stats['received'] - stats['emitted']
+        return stats
+
+
+typing_throttle = TypingThrottle()
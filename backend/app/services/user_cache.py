@@ -0,0 +1,127 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from bson import ObjectId
+from bson.errors import InvalidId
+from ..models.user_model import User
+
+# 缓存的用户身份：只包含鉴权和展示需要的字段，id 为 ObjectId，可直接用于查询条件
+UserIdentity = namedtuple('UserIdentity', ['id', 'username', 'avatar_url', 'is_admin'])
+
+
+class TTLCache:
+    """带过期时间的进程内 LRU 字典"""
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # 键 -> (过期时间, 值)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.monotonic() + ttl, value)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class UserIdentityCache:
+    """用户身份缓存：缓存已验证的 JWT 载荷和 用户ID -> 用户身份，
+    聊天和鉴权的热路径不再每次查询数据库；资料修改时主动失效，其他进程依靠 TTL 过期"""
+
+    def __init__(self):
+        self.ttl = 60
+        self.users = TTLCache()
+        self.tokens = TTLCache()
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'token_hits': 0, 'token_misses': 0, 'invalidations': 0}
+
+    def init_app(self, app):
+        """读取缓存配置"""
+        self.ttl = app.config.get('USER_CACHE_TTL_SECONDS', 60)
+        max_entries = app.config.get('USER_CACHE_MAX_ENTRIES', 10000)
+        self.users = TTLCache(max_entries)
+        self.tokens = TTLCache(max_entries)
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def get(self, user_id):
+        """返回用户身份，用户不存在或ID格式错误时返回 None；不存在的用户不做缓存"""
+        key = str(user_id)
+        identity = self.users.get(key)
+        if identity is not None:
+            self._count('hits')
+            return identity
+
+        self._count('misses')
+        try:
+            oid = ObjectId(key)
+        except (InvalidId, TypeError):
+            return None
+        doc = User.objects(id=oid).only('username', 'avatar_url', 'is_admin').as_pymongo().first()
+        if doc is None:
+            return None
+        identity = UserIdentity(doc['_id'], doc.get('username'), doc.get('avatar_url'), doc.get('is_admin', False))
+        self.users.set(key, identity, self.ttl)
+        return identity
+
+    def invalidate(self, user_id):
+        """用户资料修改或删除后调用"""
+        self.users.pop(str(user_id))
+        self._count('invalidations')
+
+    def verify_token(self, token, verify):
+        """返回令牌载荷；未命中时调用 verify(token) 完成签名校验，结果缓存到令牌过期为止。
+        命中缓存时仍检查有效期，过期令牌抛出 ValueError"""
+        payload = self.tokens.get(token)
+        now = time.time()
+        if payload is None:
+            self._count('token_misses')
+            payload = verify(token)
+            ttl = self.ttl
+            if 'exp' in payload:
+                ttl = min(ttl, payload['exp'] - now)
+            if ttl > 0:
+                self.tokens.set(token, payload, ttl)
+        else:
+            self._count('token_hits')
+        if 'exp' in payload and now > payload['exp']:
+            raise ValueError('Token has expired')
+        return payload
+
+    def stats(self):
+        """返回命中率等统计信息"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        stats['cached_users'] = len(self.users)
+        stats['cached_tokens'] = len(self.tokens)
+        return stats
+
+
+user_cache = UserIdentityCache()
@@ -0,0 +1,88 @@
+from bson import ObjectId
+from ..models.comment import Comment
+from ..models.item_model import Item
+from ..models.message_model import Message
+from ..models.user_model import User
+from .favorite_service import count_favorites
+from .user_cache import TTLCache
+
+
+class UserStatsCache:
+    """用户统计面板的短时缓存，卖家的商品变化时主动失效"""
+
+    def __init__(self):
+        self.ttl = 60
+        self._cache = TTLCache(max_entries=5000)
+
+    def init_app(self, app):
+        self.ttl = app.config.get('USER_STATS_CACHE_SECONDS', 60)
+
+    def get(self, user_id):
+        """返回用户的统计信息，用户不存在时返回 None"""
+        key = str(user_id)
+        if not ObjectId.is_valid(key):
+            return None
+        stats = self._cache.get(key)
+        if stats is None:
+            stats = compute_user_stats(ObjectId(key))
+            if stats is not None:
+                self._cache.set(key, stats, self.ttl)
+        return stats
+
+    def invalidate(self, user_id):
+        if user_id is not None:
+            self._cache.pop(str(user_id))
+
+
+def compute_user_stats(user_id):
+    """统计用户的面板数据，共五次查询：读取用户、一次 $facet 聚合算出全部商品侧指标（数量、状态分布、
+    总浏览量、收到的收藏数），以及收藏、评论、消息三个集合上各一次带索引的计数（跨集合，无法并入聚合）。
+    结果由 UserStatsCache 缓存 USER_STATS_CACHE_SECONDS，同一用户在有效期内只查询一次"""
+    user = User.objects(id=user_id).only('username', 'created_at').as_pymongo().first()
+    if user is None:
+        return None
+
+    facets = list(Item.objects(seller=user_id).aggregate([
+        {'$facet': {
+            'totals': [{'$group': {
+                '_id': None,
+                'count': {'$sum': 1},
+                'views': {'$sum': '$views'},
+                'favorites': {'$sum': '$favorites_count'}
+            }}],
+            'by_status': [{'$group': {'_id': '$status', 'count': {'$sum': 1}}}],
+            'ids': [{'$project': {'_id': 1}}]
+        }}
+    ]))
+    facet = facets[0] if facets else {}
+    totals = facet.get('totals') or [{'count': 0, 'views': 0, 'favorites': 0}]
+    item_ids = [doc['_id'] for doc in facet.get('ids', [])]
+    item_id_strings = [str(item_id) for item_id in item_ids]
+
+    # 跨集合计数：评论走 product_id 索引，消息走 (receiver, read) 索引的前缀；
+    # 只有卖家的商品变化时主动失效缓存，新的评论、消息和收藏最多延迟一个缓存有效期才计入
+    comments_received = 0
+    messages_about_items = 0
+    if item_ids:
+        comments_received = Comment.objects(product_id__in=item_id_strings, is_deleted=False).count()
+        messages_about_items = Message.objects(receiver=user_id, item__in=item_ids).count()
+
+    return {
+        "user": {
+            "id": str(user['_id']),
+            "username": user.get('username'),
+            "joined_at": user.get('created_at')
+        },
+        "items_count": totals[0]['count'],
+        "status_counts": {row['_id']: row['count'] for row in facet.get('by_status', [])},
+        "total_views": totals[0]['views'],
+        "favorites_count": count_favorites(user_id),
+        "engagement": {
+            "favorites_received": totals[0]['favorites'],
+            "comments_received": comments_received,
+            "messages_about_items": messages_about_items
+        }
+    }
+
+
+user_stats_cache = UserStatsCache()
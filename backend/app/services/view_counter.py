@@ -0,0 +1,149 @@
+import atexit
+import threading
+import time
+import uuid
+import redis
+from bson import ObjectId
+from pymongo import UpdateOne
+
+
+class ViewCounter:
+    """商品浏览量的写回缓冲：请求中只累加增量，后台线程定期批量 $inc 写入 MongoDB"""
+
+    REDIS_KEY = 'item_views:pending'
+    FLUSHING_PREFIX = 'item_views:pending:flushing:'
+    # 改名后超过这么多秒仍未删除的哈希表视为刷新失败遗留，由下次刷新接管
+    LEFTOVER_SECONDS = 60
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}  # 商品ID -> 尚未写入数据库的浏览增量
+        self._redis = None
+        self._thread = None
+        self.flush_seconds = 5
+
+    def init_app(self, app, redis_client=None):
+        """读取配置并启动后台刷新线程"""
+        self.flush_seconds = app.config.get('VIEW_COUNTER_FLUSH_SECONDS', 5)
+        if app.config.get('VIEW_COUNTER_BACKEND') == 'redis':
+            # 使用 Redis 哈希表缓冲，多个进程共享同一份增量
+            self._redis = redis_client
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='view-counter-flush', daemon=True)
+            self._thread.start()
+            atexit.register(self.flush)
+
+    def increment(self, item_id, count=1):
+        """记录一次浏览"""
+        item_id = str(item_id)
+        if self._redis is not None:
+            try:
+                self._redis.hincrby(self.REDIS_KEY, item_id, count)
+                return
+            except redis.exceptions.RedisError as e:
+                print(f"View counter Redis error, buffering locally: {e}")
+        with self._lock:
+            self._pending[item_id] = self._pending.get(item_id, 0) + count
+
+    def pending_many(self, item_ids):
+        """返回 {商品ID: 尚未写入数据库的浏览增量}"""
+        item_ids = [str(item_id) for item_id in item_ids]
+        with self._lock:
+            result = {item_id: self._pending[item_id] for item_id in item_ids if item_id in self._pending}
+        if self._redis is not None and item_ids:
+            try:
+                for item_id, value in zip(item_ids, self._redis.hmget(self.REDIS_KEY, item_ids)):
+                    if value is not None:
+                        result[item_id] = result.get(item_id, 0) + int(value)
+            except redis.exceptions.RedisError as e:
+                print(f"View counter Redis error: {e}")
+        return result
+
+    def pending(self, item_id):
+        """返回单个商品尚未写入数据库的浏览增量"""
+        return self.pending_many([item_id]).get(str(item_id), 0)
+
+    def _collect(self, key, pending):
+        # 读取并删除一个已改名的哈希表；删除成功后才计入，删除失败时留给下次刷新处理，避免重复计数
+        values = self._redis.hgetall(key)
+        self._redis.delete(key)
+        for item_id, value in values.items():
+            item_id = item_id.decode()
+            pending[item_id] = pending.get(item_id, 0) + int(value)
+
+    def _drain(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if self._redis is None:
+            return pending
+        try:
+            # 先把哈希表原子地改名再读取，避免与其他进程的累加发生竞争；键名带上改名时间，便于识别遗留的哈希表
+            flushing_key = f"{self.FLUSHING_PREFIX}{int(time.time())}:{uuid.uuid4().hex}"
+            try:
+                self._redis.rename(self.REDIS_KEY, flushing_key)
+            except redis.exceptions.ResponseError:
+                pass  # 没有待写入的增量
+            else:
+                self._collect(flushing_key, pending)
+
+            # 接管之前刷新失败（改名后未能读取或删除）遗留的哈希表：先改名认领，只有一个进程能认领成功
+            deadline = time.time() - self.LEFTOVER_SECONDS
+            for key in self._redis.scan_iter(match=f"{self.FLUSHING_PREFIX}*"):
+                key = key.decode()
+                try:
+                    renamed_at = int(key[len(self.FLUSHING_PREFIX):].split(':', 1)[0])
+                except ValueError:
+                    renamed_at = 0
+                if renamed_at > deadline:
+                    continue  # 其他进程正在处理
+                claimed_key = f"{self.FLUSHING_PREFIX}{int(time.time())}:{uuid.uuid4().hex}"
+                try:
+                    self._redis.rename(key, claimed_key)
+                except redis.exceptions.ResponseError:
+                    continue  # 已被其他进程认领
+                self._collect(claimed_key, pending)
+        except redis.exceptions.RedisError as e:
+            print(f"View counter Redis error: {e}")
+        return pending
+
+    def flush(self):
+        """将缓冲的增量批量写入数据库，返回写入的商品数"""
+        from ..models.item_model import Item
+
+        pending = self._drain()
+        operations = [
+            UpdateOne({'_id': ObjectId(item_id)}, {'$inc': {'views': count}})
+            for item_id, count in pending.items() if count and ObjectId.is_valid(item_id)
+        ]
+        if not operations:
+            return 0
+        try:
+            Item._get_collection().bulk_write(operations, ordered=False)
+        except Exception as e:
+            print(f"Error flushing item views: {e}")
+            # 写入失败时放回本地缓冲，下次重试
+            with self._lock:
+                for item_id, count in pending.items():
+                    self._pending[item_id] = self._pending.get(item_id, 0) + count
+            return 0
+        try:
+            from .category_stats import record_views
+            record_views(pending)
+        except Exception as e:
+            print(f"Error updating category views: {e}")
+        # 缓存的商品详情中的浏览量已过时，使其失效，下次请求时重新读取
+        from .response_cache import response_cache
+        response_cache.invalidate(*(f"item:{item_id}" for item_id in pending))
+        return len(operations)
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_seconds)
+            try:
+                self.flush()
+            except Exception as e:
+                # 单次刷新失败不能终止后台线程
+                print(f"Error flushing item views: {e}")
+
+
+view_counter = ViewCounter()
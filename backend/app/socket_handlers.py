@@ -2,15 +2,16 @@ from flask_socketio import emit, join_room, leave_room
 from flask_jwt_extended import jwt_required, get_jwt_identity, decode_token
 from flask import request, current_app
 from .models.message_model import Message
-from .models.user_model import User
 from .models.item_model import Item
-import datetime
+from .services.conversation_service import mark_messages_read
+from .services.message_writer import message_writer, MessageQueueFull
+from .services.session_registry import session_registry
+from .services.user_cache import user_cache
+from .services.typing_throttle import typing_throttle
+from .utils.fast_json import isoformat, parse_datetime
 import json
 import jwt
-
-# 使用内存存储用户会话信息，而不是依赖 Redis
-# 存储用户会话信息的字典，key是用户ID，value是会话ID
-user_sessions = {}
+from bson import ObjectId
 
 def register_handlers(socketio):
     """注册所有Socket.IO事件处理函数"""
@@ -27,11 +28,9 @@ def register_handlers(socketio):
         print('Client disconnected', request.sid)
         
         # 移除用户的会话信息
-        for user_id, session_id in list(user_sessions.items()):
-            if session_id == request.sid:
-                del user_sessions[user_id]
-                print(f"User {user_id} logged out")
-                break
+        user_id, all_offline = session_registry.remove(request.sid)
+        if user_id and all_offline:
+            print(f"User {user_id} logged out")
     
     @socketio.on('authenticate')
     def handle_authenticate(data):
@@ -50,48 +49,42 @@ def register_handlers(socketio):
                 emit('authentication_error', {'message': 'JWT secret not configured'})
                 return
                 
-            try:
-                # 使用Flask-JWT-Extended的decode_token
-                payload = decode_token(token)
-                user_id = payload['sub']  # JWT中的用户ID
-                
-                # 检查令牌有效期
-                if 'exp' in payload and datetime.datetime.now().timestamp() > payload['exp']:
-                    emit('authentication_error', {'message': 'Token has expired'})
-                    return
-            except Exception as e:
-                # 尝试使用PyJWT库直接解析
+            def verify(raw_token):
                 try:
-                    payload = jwt.decode(
-                        token, 
+                    # 使用Flask-JWT-Extended的decode_token
+                    return decode_token(raw_token)
+                except Exception:
+                    # 尝试使用PyJWT库直接解析
+                    return jwt.decode(
+                        raw_token, 
                         jwt_secret_key, 
                         algorithms=['HS256'],
                         options={"verify_signature": True}
                     )
-                    user_id = payload['sub']
-                except Exception as jwt_error:
-                    print(f"JWT decode error: {jwt_error}")
-                    emit('authentication_error', {'message': f'Invalid token: {str(jwt_error)}'})
-                    return
             
-            # 检查用户是否存在
-            user = User.objects(id=user_id).first()
+            try:
+                # 已验证过的令牌直接从缓存取载荷，缓存命中时仍会检查有效期
+                payload = user_cache.verify_token(token, verify)
+                user_id = payload['sub']  # JWT中的用户ID
+            except ValueError as e:
+                emit('authentication_error', {'message': str(e)})
+                return
+            except Exception as jwt_error:
+                print(f"JWT decode error: {jwt_error}")
+                emit('authentication_error', {'message': f'Invalid token: {str(jwt_error)}'})
+                return
+            
+            # 检查用户是否存在（使用身份缓存）
+            user = user_cache.get(user_id)
             if not user:
                 emit('authentication_error', {'message': 'User not found'})
                 return
             
-            # 如果该用户已经有一个活跃会话，通知旧会话
-            if user_id in user_sessions:
-                old_session = user_sessions[user_id]
-                if old_session != request.sid:  # 如果不是同一个会话ID
-                    # 通知旧会话它已被替代
-                    try:
-                        emit('session_expired', {'message': 'Your session has been taken over by another login'}, room=old_session)
-                    except Exception as e:
-                        print(f"Error notifying old session: {e}")
-            
-            # 记录用户的会话ID
-            user_sessions[user_id] = request.sid
+            # 记录用户的会话ID（支持多设备同时在线，不再挤掉旧会话）
+            previous_user_id = session_registry.user_for(request.sid)
+            if previous_user_id and previous_user_id != user_id:
+                leave_room(previous_user_id)
+            session_registry.add(user_id, request.sid)
             
             # 加入以用户ID命名的房间，用于私聊
             join_room(user_id)
@@ -120,57 +113,76 @@ def register_handlers(socketio):
             content = data['content']
             
             # 安全检查：确保发送方ID与当前认证的用户匹配
-            for user_id, session_id in user_sessions.items():
-                if session_id == request.sid and user_id != sender_id:
-                    emit('error', {'message': 'You can only send messages as yourself'})
-                    return
+            current_user_id = session_registry.user_for(request.sid)
+            if current_user_id is not None and current_user_id != sender_id:
+                emit('error', {'message': 'You can only send messages as yourself'})
+                return
             
-            # 查找发送者和接收者
-            sender = User.objects(id=sender_id).first()
-            receiver = User.objects(id=receiver_id).first()
+            # 查找发送者和接收者（使用身份缓存，稳定聊天时不查询用户集合）
+            sender = user_cache.get(sender_id)
+            receiver = user_cache.get(receiver_id)
             
             if not sender or not receiver:
                 emit('error', {'message': 'Sender or receiver not found'})
                 return
             
-            # 创建新消息
+            # 创建新消息（在进程内分配ID，写入数据库前即可推送）
             new_message = Message(
-                sender=sender,
-                receiver=receiver,
+                id=ObjectId(),
+                sender=sender.id,
+                receiver=receiver.id,
                 content=content
             )
             
             # 如果指定了商品，添加商品引用
+            item = None
             if 'item_id' in data and data['item_id']:
-                item = Item.objects(id=data['item_id']).first()
+                item = Item.objects(id=data['item_id']).only('title').first()
                 if item:
                     new_message.item = item
             
-            new_message.save()
-            
             # 准备消息数据
             message_data = {
                 'id': str(new_message.id),
                 'sender_id': sender_id,
                 'receiver_id': receiver_id,
                 'content': content,
-                'timestamp': new_message.timestamp.isoformat(),
+                'timestamp': isoformat(new_message.timestamp),
                 'read': False
             }
             
-            if hasattr(new_message, 'item') and new_message.item:
+            if item:
                 message_data['item'] = {
-                    'id': str(new_message.item.id),
-                    'title': new_message.item.title
+                    'id': str(item.id),
+                    'title': item.title
                 }
             
-            # 发送给发送者确认
-            emit('message_sent', message_data)
+            sid = request.sid
+            
+            def acknowledge(persisted):
+                # 写入完成后再向发送者确认（可能在后台任务中调用，因此指定会话ID）
+                if persisted:
+                    socketio.emit('message_sent', message_data, to=sid)
+                else:
+                    socketio.emit('error', {'message': 'Failed to save message', 'id': message_data['id']}, to=sid)
+            
+            try:
+                message_writer.submit(new_message, acknowledge if message_writer.ack_after_write else None)
+            except MessageQueueFull:
+                emit('error', {'message': 'Server busy, please retry', 'id': message_data['id']})
+                return
+            
+            if not message_writer.ack_after_write:
+                # 入队即确认
+                emit('message_sent', message_data)
             
             # 查看接收者是否在线
-            if receiver_id in user_sessions:
-                # 发送到接收者的房间
+            if session_registry.is_online(receiver_id):
+                # 发送到接收者的房间（包括其所有设备）
                 emit('new_message', message_data, room=receiver_id)
+                # 消息已发出，结束“正在输入”状态
+                if typing_throttle.reset(sender_id, receiver_id):
+                    emit('stopped_typing', {'sender_id': sender_id}, room=receiver_id)
             
             print(f"Message sent from {sender.username} to {receiver.username}")
         except Exception as e:
@@ -179,42 +191,47 @@ def register_handlers(socketio):
     
     @socketio.on('mark_read')
     def handle_mark_read(data):
-        """标记消息为已读"""
+        """标记消息为已读：传入 message_id 时将该消息及之前的未读消息一并标记，
+        或传入 sender_id（可选 up_to 时间戳）标记该联系人发来的全部未读消息"""
         try:
-            if 'message_id' not in data:
+            if 'message_id' not in data and 'sender_id' not in data:
                 emit('error', {'message': 'Missing message_id'})
                 return
             
-            message_id = data['message_id']
-            message = Message.objects(id=message_id).first()
-            
-            if not message:
-                emit('error', {'message': 'Message not found'})
-                return
-            
             # 安全检查：确保只有接收者可以标记消息为已读
-            current_user_id = None
-            for user_id, session_id in user_sessions.items():
-                if session_id == request.sid:
-                    current_user_id = user_id
-                    break
+            current_user_id = session_registry.user_for(request.sid)
             
-            if not current_user_id or str(message.receiver.id) != current_user_id:
+            if not current_user_id:
                 emit('error', {'message': 'You can only mark messages sent to you as read'})
                 return
             
-            # 标记为已读
-            message.read = True
-            message.save()
+            message_id = data.get('message_id')
+            if message_id:
+                message = Message.objects(id=message_id).no_dereference().only('sender', 'receiver', 'timestamp').first()
+                
+                if not message:
+                    emit('error', {'message': 'Message not found'})
+                    return
+                
+                if str(message.receiver.id) != current_user_id:
+                    emit('error', {'message': 'You can only mark messages sent to you as read'})
+                    return
+                
+                sender_id = str(message.sender.id)
+                up_to = message.timestamp
+            else:
+                sender_id = data['sender_id']
+                up_to = parse_datetime(data['up_to']) if data.get('up_to') else None
             
-            # 通知发送者消息已读
-            if str(message.sender.id) in user_sessions:
-                emit('message_read', {
-                    'message_id': message_id,
-                    'read_at': datetime.datetime.utcnow().isoformat()
-                }, room=str(message.sender.id))
+            # 一次 update_many 标记为已读，并向发送者发送一条批量回执
+            count, up_to = mark_messages_read(current_user_id, sender_id, up_to=up_to, message_id=message_id)
             
-            emit('marked_read', {'message_id': message_id})
+            emit('marked_read', {
+                'message_id': message_id,
+                'sender_id': sender_id,
+                'count': count,
+                'up_to': isoformat(up_to)
+            })
         except Exception as e:
             print(f"Error marking message as read: {e}")
             emit('error', {'message': f'Failed to mark message as read: {str(e)}'})
@@ -230,17 +247,17 @@ def register_handlers(socketio):
             receiver_id = data['receiver_id']
             
             # 安全检查：确保发送方ID与当前认证的用户匹配
-            current_user_id = None
-            for user_id, session_id in user_sessions.items():
-                if session_id == request.sid:
-                    current_user_id = user_id
-                    break
+            current_user_id = session_registry.user_for(request.sid)
             
             if not current_user_id or current_user_id != sender_id:
                 return
             
+            # 限流：同一对用户每隔一段时间最多推送一次，空闲后由后台任务推送 stopped_typing
+            if not typing_throttle.typing(sender_id, receiver_id):
+                return
+            
             # 检查接收者是否在线
-            if receiver_id in user_sessions:
+            if session_registry.is_online(receiver_id):
                 emit('user_typing', {
                     'sender_id': sender_id
                 }, room=receiver_id)
@@ -0,0 +1,73 @@
+import datetime
+import json
+from collections.abc import Mapping
+from bson import DBRef, ObjectId
+from flask.json.provider import JSONProvider
+
+try:
+    import orjson  # 可选依赖：安装 orjson 后用它编码 JSON 响应
+except ImportError:
+    orjson = None
+
+
+def isoformat(value):
+    """将时间格式化为带时区的 ISO 8601 字符串；数据库中的时间都是 UTC（datetime.utcnow），
+    不带时区的时间按 UTC 输出。不经过 JSON provider 的载荷（如 Socket.IO 推送）使用它，与接口响应保持同一格式"""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.isoformat()
+
+
+def parse_datetime(text):
+    """解析客户端传回的 ISO 8601 时间，带时区的时间转换为与数据库一致的不带时区的 UTC 时间"""
+    value = datetime.datetime.fromisoformat(text)
+    if value.tzinfo is not None:
+        value = value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _default(value):
+    # 编码器不能直接处理的类型；SON 是 dict 的子类，两种编码器都能直接编码
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, DBRef):
+        return str(value.id)
+    if isinstance(value, datetime.datetime):
+        return isoformat(value)
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value):
+    """编码为 UTF-8 JSON 字节串；datetime 输出带时区的 ISO 8601 格式，ObjectId 输出字符串"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_NAIVE_UTC)
+    return json.dumps(value, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(data):
+    """解析 JSON 字符串或字节串"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(JSONProvider):
+    """应用级 JSON 编码：jsonify 直接编码 ObjectId、datetime 和 SON，
+    路由可以返回 as_pymongo()/to_mongo() 的原始文档，不必逐个字段转换"""
+
+    mimetype = 'application/json'
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        # 直接使用编码后的字节串，省去一次 str -> bytes 的转换
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj), mimetype=self.mimetype)
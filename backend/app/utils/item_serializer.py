@@ -0,0 +1,137 @@
+from flask import g, has_app_context
+from bson import DBRef, ObjectId
+from ..models.user_model import User
+from ..models.item_model import Item
+from ..services.view_counter import view_counter
+
+class InvalidView(ValueError):
+    """fields 查询参数不是已知的视图"""
+
+
+UNKNOWN_SELLER = {'id': 'unknown', 'username': 'Unknown'}
+# 商品卡片（列表、浏览历史、收藏等场景）需要的字段
+CARD_FIELDS = ('title', 'price', 'category', 'images', 'status')
+# 商品接口的视图：card 用于列表页（描述只返回摘要），detail 用于详情页
+ITEM_VIEWS = {
+    'card': ('title', 'description', 'price', 'category', 'images', 'seller',
+             'created_at', 'status', 'views', 'favorites_count'),
+    'detail': ('title', 'description', 'price', 'category', 'images', 'seller',
+               'created_at', 'updated_at', 'status', 'views', 'favorites_count'),
+}
+# 原始文档中可能缺失的字段的默认值（与 Item 模型一致）
+FIELD_DEFAULTS = {'images': [], 'status': 'available', 'views': 0, 'favorites_count': 0}
+# 卡片视图中描述摘要的最大字符数
+SUMMARY_LENGTH = 80
+
+
+def ref_id(value):
+    """取得引用字段的 ObjectId，不触发解引用"""
+    if value is None or isinstance(value, ObjectId):
+        return value
+    if isinstance(value, DBRef):
+        return value.id
+    return getattr(value, 'id', value)
+
+
+def _request_user_cache():
+    # 请求级用户缓存，同一请求内多次序列化不会重复查询
+    if has_app_context():
+        if '_user_cache' not in g:
+            g._user_cache = {}
+        return g._user_cache
+    return {}
+
+
+def resolve_users(user_ids):
+    """用一次 $in 查询批量获取用户的 id 和 username，返回 {ObjectId: dict}"""
+    cache = _request_user_cache()
+    missing = {uid for uid in user_ids if uid is not None and uid not in cache}
+    if missing:
+        for doc in User.objects(id__in=list(missing)).only('username').as_pymongo():
+            cache[doc['_id']] = {'id': str(doc['_id']), 'username': doc.get('username')}
+    return {uid: cache[uid] for uid in user_ids if uid in cache}
+
+
+def to_object_id(value):
+    """将字符串、ObjectId 或引用转换为 ObjectId，格式错误时返回 None"""
+    value = ref_id(value)
+    if isinstance(value, ObjectId):
+        return value
+    return ObjectId(value) if value and ObjectId.is_valid(value) else None
+
+
+def item_cards(item_ids, fields=CARD_FIELDS):
+    """用一次带投影的 $in 查询批量获取商品卡片，返回按传入顺序排列的 {ObjectId: dict}；
+    ID 可以是字符串、ObjectId 或引用，格式错误或已删除的商品会被跳过"""
+    order = []   # 保持传入顺序
+    seen = set()  # 去重
+    for item_id in item_ids:
+        oid = to_object_id(item_id)
+        if oid is not None and oid not in seen:
+            seen.add(oid)
+            order.append(oid)
+    if not order:
+        return {}
+    docs = {doc['_id']: doc for doc in Item.objects(id__in=order).only(*fields).as_pymongo()}
+    cards = {}
+    for oid in order:
+        doc = docs.get(oid)
+        if doc is not None:
+            card = {'id': str(oid)}
+            card.update((field, doc.get(field)) for field in fields)
+            cards[oid] = card
+    return cards
+
+
+def resolve_items(item_ids):
+    """批量获取商品的 id 和标题，返回 {ObjectId: dict}"""
+    return item_cards(item_ids, fields=('title',))
+
+
+def resolve_sellers(items):
+    """批量解析一组商品的卖家信息"""
+    return resolve_users([ref_id(item._data.get('seller')) for item in items])
+
+
+def item_view(value, default='card'):
+    """解析 fields 查询参数（card 或 detail），未指定时使用 default，取值未知时抛出 InvalidView"""
+    view = value or default
+    if view not in ITEM_VIEWS:
+        raise InvalidView(f"Unknown fields view: {view} (expected one of: {', '.join(ITEM_VIEWS)})")
+    return view
+
+
+def project_items(queryset, view='card'):
+    """只加载视图需要的字段，以原始文档（as_pymongo）返回，不构造模型对象"""
+    return queryset.only(*ITEM_VIEWS[view]).as_pymongo()
+
+
+def _summary(text):
+    # 列表页只显示两行描述，卡片视图只返回摘要
+    if text and len(text) > SUMMARY_LENGTH:
+        return text[:SUMMARY_LENGTH] + '…'
+    return text
+
+
+def doc_to_dict(doc, view, seller, pending_views=0):
+    """将原始商品文档格式化为接口返回的字典，pending_views 为尚未写入数据库的浏览增量；
+    日期保留为 datetime，由应用的 JSON 编码器输出为 ISO 8601"""
+    result = {'id': str(doc['_id'])}
+    for field in ITEM_VIEWS[view]:
+        result[field] = doc.get(field, FIELD_DEFAULTS.get(field))
+    result['seller'] = seller or UNKNOWN_SELLER
+    result['views'] = (result['views'] or 0) + pending_views
+    if view == 'card':
+        result['description'] = _summary(result['description'])
+    return result
+
+
+def serialize_item_docs(docs, view='card'):
+    """格式化商品文档列表，所有卖家在一次查询中解析"""
+    docs = list(docs)
+    sellers = resolve_users([ref_id(doc.get('seller')) for doc in docs])
+    pending_views = view_counter.pending_many([doc['_id'] for doc in docs])
+    return [
+        doc_to_dict(doc, view, sellers.get(ref_id(doc.get('seller'))), pending_views.get(str(doc['_id']), 0))
+        for doc in docs
+    ]
@@ -0,0 +1,72 @@
+import base64
+import binascii
+import datetime
+from bson import ObjectId, json_util
+
+# 游标中允许出现的排序字段值类型；字典、列表等会被当作查询操作符（例如 {"$ne": null}），一律拒绝
+CURSOR_VALUE_TYPES = (type(None), bool, int, float, str, datetime.datetime, ObjectId)
+
+
+class InvalidCursor(ValueError):
+    """客户端传入的游标无效（格式错误或与排序方式不匹配）"""
+
+
+def _parse_order(order):
+    """将 ('-created_at', '-id') 形式的排序键转换为 [(字段名, 属性名, 方向)]"""
+    keys = []
+    for spec in order:
+        direction = -1 if spec.startswith('-') else 1
+        attr = spec.lstrip('+-')
+        keys.append(('_id' if attr == 'id' else attr, attr, direction))
+    return keys
+
+
+def encode_cursor(doc, order):
+    """根据文档的排序字段值生成不透明游标，doc 可以是模型对象或 as_pymongo() 返回的原始文档"""
+    if isinstance(doc, dict):
+        values = [doc.get(field) for field, _, _ in _parse_order(order)]
+    else:
+        values = [getattr(doc, attr) for _, attr, _ in _parse_order(order)]
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """解析游标，格式错误或包含非标量值时抛出 InvalidCursor（ValueError 的子类）"""
+    try:
+        values = json_util.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+    if not isinstance(values, list) or not all(isinstance(value, CURSOR_VALUE_TYPES) for value in values):
+        raise InvalidCursor("Invalid cursor")
+    return values
+
+
+def keyset_query(order, values):
+    """构造“位于游标之后”的查询条件，例如 created_at < v 或 (created_at == v 且 _id < id)"""
+    keys = _parse_order(order)
+    if len(values) != len(keys):
+        raise InvalidCursor("Cursor does not match sort order")
+    clauses = []
+    for i, (field, _, direction) in enumerate(keys):
+        clause = {prev_field: values[j] for j, (prev_field, _, _) in enumerate(keys[:i])}
+        clause[field] = {'$gt' if direction > 0 else '$lt': values[i]}
+        clauses.append(clause)
+    # 在第一个排序键上附加闭区间条件，使索引扫描直接从游标位置开始
+    first_field, _, first_direction = keys[0]
+    return {first_field: {'$gte' if first_direction > 0 else '$lte': values[0]}, '$or': clauses}
+
+
+def keyset_page(queryset, order, after=None, limit=10):
+    """按排序键做游标分页，返回 (文档列表, 下一页游标)；没有下一页时游标为 None"""
+    if after:
+        queryset = queryset.filter(__raw__=keyset_query(order, decode_cursor(after)))
+    docs = list(queryset.order_by(*order).limit(limit + 1))
+    has_more = len(docs) > limit
+    docs = docs[:limit]
+    next_cursor = encode_cursor(docs[-1], order) if has_more and docs else None
+    return docs, next_cursor
+
+
+def wants_total(args):
+    """游标分页默认不计算总数，传入 include_total=true 时才执行 count()"""
+    return args.get('include_total', 'false').lower() == 'true'
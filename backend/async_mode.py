@@ -0,0 +1,50 @@
+import importlib.util
+import sys
+from config import Config
+
+# eventlet 在 Python 3.13 上存在兼容性问题，此时回退到其他模式
+EVENTLET_MAX_PYTHON = (3, 12)
+
+
+def _available(module):
+    return importlib.util.find_spec(module) is not None
+
+
+def detect_async_mode(requested=None):
+    """根据配置和已安装的依赖确定 SocketIO 异步模式（不做猴子补丁）
+
+    requested 可以是 threading（默认）、eventlet、gevent 或 auto；auto 依次尝试 eventlet、gevent，
+    都不可用时使用 threading。指定的模式不可用时同样回退到 threading。
+    """
+    requested = (requested or Config.SOCKETIO_ASYNC_MODE).lower()
+    candidates = ['eventlet', 'gevent'] if requested == 'auto' else [requested]
+    for mode in candidates:
+        if mode == 'threading':
+            return 'threading'
+        if mode == 'eventlet':
+            if sys.version_info[:2] > EVENTLET_MAX_PYTHON:
+                print(f"eventlet is not supported on Python {sys.version_info.major}.{sys.version_info.minor}")
+                continue
+            if _available('eventlet'):
+                return 'eventlet'
+        elif mode == 'gevent':
+            if _available('gevent'):
+                return 'gevent'
+        print(f"SocketIO async mode '{mode}' is not available")
+    return 'threading'
+
+
+def apply_async_mode(requested=None):
+    """确定异步模式并尽早打猴子补丁，必须在导入 pymongo、redis 等库之前调用"""
+    mode = detect_async_mode(requested)
+    try:
+        if mode == 'eventlet':
+            import eventlet
+            eventlet.monkey_patch()
+        elif mode == 'gevent':
+            from gevent import monkey
+            monkey.patch_all()
+    except Exception as e:
+        print(f"Failed to initialise {mode}, falling back to threading: {e}")
+        mode = 'threading'
+    return mode
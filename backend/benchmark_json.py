@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# 先导入 app 包，使异步模式的猴子补丁在导入其他库之前完成
+from app.utils import fast_json
+from app.utils.fast_json import FastJSONProvider
+from app.utils.item_serializer import doc_to_dict
+import datetime
+import sys
+import timeit
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+SELLER = {'id': str(ObjectId()), 'username': 'seller'}
+
+
+def make_docs(count):
+    """构造 count 个与 as_pymongo() 结构相同的商品文档（不访问数据库）"""
+    now = datetime.datetime.utcnow()
+    return [{
+        '_id': ObjectId(),
+        'title': f'二手商品 {i}',
+        'description': '九成新，使用痕迹很少，配件齐全，支持当面验货。' * 10,
+        'price': 100.0 + i,
+        'category': 'electronics',
+        'images': [f'/static/uploads/{i}_1.jpg', f'/static/uploads/{i}_2.jpg'],
+        'seller': ObjectId(),
+        'created_at': now - datetime.timedelta(minutes=i),
+        'updated_at': now,
+        'status': 'available',
+        'views': i * 3,
+        'favorites_count': i % 7
+    } for i in range(count)]
+
+
+def legacy_dict(doc):
+    # 改造前的做法：每个字段手动转换（str(ObjectId)、isoformat()），返回完整描述
+    return {
+        "id": str(doc['_id']),
+        "title": doc['title'],
+        "description": doc['description'],
+        "price": doc['price'],
+        "category": doc['category'],
+        "images": doc['images'],
+        "seller": SELLER,
+        "created_at": doc['created_at'].isoformat(),
+        "updated_at": doc['updated_at'].isoformat(),
+        "status": doc['status'],
+        "views": doc['views']
+    }
+
+
+def benchmark(count=100, number=500):
+    """比较 count 个商品的列表响应在各种编码方式下的序列化耗时（每次请求的平均毫秒数）和响应大小"""
+    docs = make_docs(count)
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    default_provider.compact = True
+    fast_provider = FastJSONProvider(app)
+    legacy = lambda: {'items': [legacy_dict(doc) for doc in docs]}
+    card = lambda: {'items': [doc_to_dict(doc, 'card', SELLER) for doc in docs]}
+    cases = [
+        ('before: hand-converted dicts + jsonify', default_provider, legacy, None),
+        ('after:  card view + stdlib fallback', fast_provider, card, False),
+        ('after:  card view + orjson', fast_provider, card, True),
+        ('after:  raw as_pymongo docs + orjson', fast_provider, lambda: {'items': docs}, True),
+    ]
+    installed = fast_json.orjson
+    print(f"{count} items, {number} runs each")
+    with app.app_context():
+        for name, provider, build, use_orjson in cases:
+            if use_orjson and installed is None:
+                print(f"{name:<42} skipped (orjson is not installed)")
+                continue
+            if use_orjson is not None:
+                fast_json.orjson = installed if use_orjson else None
+            body = provider.response(build()).get_data()
+            seconds = timeit.timeit(lambda: provider.response(build()).get_data(), number=number)
+            print(f"{name:<42} {seconds / number * 1000:8.3f} ms  {len(body):>7} bytes")
+    fast_json.orjson = installed
+
+
+if __name__ == '__main__':
+    # 用法: python benchmark_json.py [商品数] [重复次数]
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 100,
+              int(sys.argv[2]) if len(sys.argv) > 2 else 500)
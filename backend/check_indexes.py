@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+import sys
+from app import create_app
+from app.models.item_model import Item
+from app.services.index_planner import reconcile_indexes, explain_listing_queries
+
+def check_indexes():
+    """校对商品集合的索引，并检查商品列表查询是否全部走索引"""
+    app = create_app(background_jobs_enabled=False)
+    with app.app_context():
+        # 先同步创建缺失的索引，再执行 explain
+        reconcile_indexes(Item, app.config.get('INDEX_DROP_OBSOLETE', False))
+
+        failed = 0
+        for name, stages, ok in explain_listing_queries():
+            print(f"{'OK  ' if ok else 'FAIL'} {name}: {' <- '.join(stages)}")
+            if not ok:
+                failed += 1
+
+        if failed:
+            print(f"\n{failed} 个查询出现 COLLSCAN 或内存排序 SORT 阶段")
+        else:
+            print("\n所有商品列表查询均使用索引")
+        return failed
+
+if __name__ == '__main__':
+    sys.exit(1 if check_indexes() else 0)
@@ -13,6 +13,34 @@ class Config:
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'your-jwt-secret-key' # JWT 密钥
     REDIS_URL = os.environ.get('REDIS_URL') or 'redis://localhost:6379/0' # Redis 连接 URL
     DEBUG = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true' # 是否开启 Debug 模式
+    SOCKETIO_ASYNC_MODE = os.environ.get('SOCKETIO_ASYNC_MODE', 'threading') # SocketIO 异步模式: threading（默认）、eventlet、gevent 或 auto（自动选择协程库）
+    REALTIME_CLUSTERED = os.environ.get('REALTIME_CLUSTERED', 'False').lower() == 'true' # 多进程部署：使用 Redis 作为 Socket.IO 消息队列并共享在线状态
+    PRESENCE_TTL_SECONDS = int(os.environ.get('PRESENCE_TTL_SECONDS', 60)) # 在线状态心跳过期时间（秒）
+    VIEW_COUNTER_BACKEND = os.environ.get('VIEW_COUNTER_BACKEND', 'memory') # 浏览量缓冲后端: memory 或 redis
+    VIEW_COUNTER_FLUSH_SECONDS = int(os.environ.get('VIEW_COUNTER_FLUSH_SECONDS', 5)) # 浏览量批量写入间隔（秒）
+    RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'memory') # 响应缓存后端: memory、redis 或 none
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL', 30)) # 响应缓存有效期（秒）
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES', 1024)) # 进程内缓存最大条目数
+    INDEX_DROP_OBSOLETE = os.environ.get('INDEX_DROP_OBSOLETE', 'False').lower() == 'true' # 启动时是否删除模型中未声明的索引
+    MESSAGE_WRITE_MODE = os.environ.get('MESSAGE_WRITE_MODE', 'sync') # 实时消息写入方式: sync（同步保存）或 async（后台批量写入）
+    MESSAGE_WRITE_ACK = os.environ.get('MESSAGE_WRITE_ACK', 'write') # async 模式下何时确认 message_sent: write（写入后）或 enqueue（入队后，进程崩溃可能丢消息）
+    MESSAGE_QUEUE_SIZE = int(os.environ.get('MESSAGE_QUEUE_SIZE', 10000)) # 消息写入队列容量
+    MESSAGE_BATCH_SIZE = int(os.environ.get('MESSAGE_BATCH_SIZE', 200)) # 每次 insert_many 的最大消息数
+    MESSAGE_ENQUEUE_TIMEOUT = float(os.environ.get('MESSAGE_ENQUEUE_TIMEOUT', 1.0)) # 队列已满时发送方最多等待的秒数，超时返回 Server busy
+    TYPING_THROTTLE_SECONDS = float(os.environ.get('TYPING_THROTTLE_SECONDS', 2.0)) # 同一对用户“正在输入”通知的最小推送间隔（秒）
+    TYPING_IDLE_SECONDS = float(os.environ.get('TYPING_IDLE_SECONDS', 3.0)) # 超过该时间没有输入事件则推送 stopped_typing（秒）
+    USER_CACHE_TTL_SECONDS = int(os.environ.get('USER_CACHE_TTL_SECONDS', 60)) # 用户身份与令牌缓存有效期（秒），其他进程的资料修改最多延迟这么久生效
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 10000)) # 用户身份缓存最大条目数
+    CATEGORY_STATS_RECONCILE_SECONDS = int(os.environ.get('CATEGORY_STATS_RECONCILE_SECONDS', 600)) # 分类统计全量校对间隔（秒）
+    FAVORITE_COUNTS_RECONCILE_SECONDS = int(os.environ.get('FAVORITE_COUNTS_RECONCILE_SECONDS', 3600)) # 商品收藏数全量校对间隔（秒）
+    USER_STATS_CACHE_SECONDS = int(os.environ.get('USER_STATS_CACHE_SECONDS', 60)) # 用户统计面板缓存有效期（秒）
+    RECOMMENDATION_TOP_K = int(os.environ.get('RECOMMENDATION_TOP_K', 20)) # 每个用户预计算的推荐数量
+    RECOMMENDATION_REFRESH_SECONDS = int(os.environ.get('RECOMMENDATION_REFRESH_SECONDS', 3600)) # 推荐表完整重算间隔（秒），两次重算之间新的浏览和收藏不影响推荐
+    ADMIN_STATS_MAX_AGE_SECONDS = int(os.environ.get('ADMIN_STATS_MAX_AGE_SECONDS', 60)) # 管理后台统计允许的最大陈旧时间（秒）
+    ADMIN_STATS_RECONCILE_SECONDS = int(os.environ.get('ADMIN_STATS_RECONCILE_SECONDS', 3600)) # 日统计全量校对间隔（秒）
+    SEARCH_INDEX_REFRESH_SECONDS = int(os.environ.get('SEARCH_INDEX_REFRESH_SECONDS', 300)) # 商品搜索索引全量重建间隔（秒）
+    BACKGROUND_JOBS = os.environ.get('BACKGROUND_JOBS', 'True').lower() == 'true' # 是否在本进程启动全量扫描类后台任务（索引校对、数据回填、统计校对、推荐重算）；多进程部署时只由持有 Redis 锁的一个进程运行
+    BACKGROUND_JOBS_LOCK_SECONDS = int(os.environ.get('BACKGROUND_JOBS_LOCK_SECONDS', 60)) # 后台任务领导锁的有效期（秒），持锁进程退出后由其他进程接管
     # 可以根据需要添加更多配置项
     # 例如：
     # UPLOAD_FOLDER = 'uploads'
@@ -0,0 +1,24 @@
+# gunicorn 生产环境配置：gunicorn -c gunicorn.conf.py wsgi:app
+import os
+from async_mode import detect_async_mode
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+
+# Socket.IO 的长轮询和握手需要粘性会话，gunicorn 无法在 worker 之间提供，Redis 消息队列也不能代替：
+# 每个 gunicorn 进程只运行一个 worker；需要扩容时启动多个进程（REALTIME_CLUSTERED=true），
+# 由支持粘性会话的负载均衡（例如 nginx ip_hash）分发连接
+workers = 1
+
+# 协程 worker 中每个空闲 websocket 只占用一个协程，单个 worker 即可承载数千连接
+_mode = detect_async_mode()
+if _mode == 'eventlet':
+    worker_class = 'eventlet'
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 10000))
+elif _mode == 'gevent':
+    worker_class = 'gevent'
+    worker_connections = int(os.environ.get('GUNICORN_WORKER_CONNECTIONS', 10000))
+else:
+    worker_class = 'gthread'
+    threads = int(os.environ.get('GUNICORN_THREADS', 100))
+
+timeout = 120
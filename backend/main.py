@@ -1,5 +1,5 @@
-# 不使用 eventlet，避免 Python 3.13 兼容性问题
-# 注意：这种模式在生产环境中性能较低，生产环境建议使用 Python 3.10/3.11 + eventlet
+# SocketIO 异步模式由 SOCKETIO_ASYNC_MODE 决定（默认 threading；设为 eventlet、gevent 或 auto 可改用协程库）
+# 生产环境请使用 gunicorn 启动：gunicorn -c gunicorn.conf.py wsgi:app
 
 from app import create_app, socketio # 从 app 包导入 create_app 函数和 socketio 实例
 
@@ -7,12 +7,13 @@ app = create_app() # 创建 Flask 应用实例
 
 if __name__ == '__main__':
     # 使用 SocketIO 的 run 方法来启动服务器
-    print("Starting Flask application with Socket.IO (threading mode)...")
-    print("Note: This mode has lower performance. For production, use Python 3.10/3.11 with eventlet")
+    print(f"Starting Flask application with Socket.IO ({socketio.async_mode} mode)...")
+    if socketio.async_mode == 'threading':
+        print("Note: This mode has lower performance. For production, install eventlet or gevent and run with gunicorn")
     socketio.run(app, 
                 host='0.0.0.0', 
                 port=5000, 
                 debug=app.config['DEBUG'], 
                 use_reloader=app.config['DEBUG'],
                 allow_unsafe_werkzeug=True if app.config['DEBUG'] else False
-                ) 
\ No newline at end of file
+                )
@@ -0,0 +1,15 @@
+#!/usr/bin/env python
+import sys
+from app import create_app
+from app.services.browse_history_service import migrate_embedded_history
+
+def migrate(batch_size=500):
+    """将用户文档中内嵌的浏览历史迁移到 browse_history 集合（可重复执行，只处理尚未迁移的用户）"""
+    app = create_app(background_jobs_enabled=False)
+    with app.app_context():
+        migrated = migrate_embedded_history(batch_size)
+        print(f"迁移完成，共迁移 {migrated} 个用户的浏览历史")
+
+if __name__ == '__main__':
+    # 用法: python migrate_browse_history.py [批大小]
+    migrate(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+import sys
+from app import create_app
+from app.services.conversation_service import backfill_conversation_ids, backfill_conversation_summaries
+
+def migrate(batch_size=1000):
+    """为历史消息分批补写 conversation_id，并为所有用户补建会话摘要（可重复执行）"""
+    app = create_app(background_jobs_enabled=False)
+    with app.app_context():
+        updated = backfill_conversation_ids(batch_size)
+        summaries = backfill_conversation_summaries(batch_size)
+        print(f"迁移完成，共更新 {updated} 条消息，写入 {summaries} 条会话摘要")
+
+if __name__ == '__main__':
+    # 用法: python migrate_conversation_ids.py [批大小]
+    migrate(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
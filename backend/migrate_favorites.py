@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+import sys
+from app import create_app
+from app.services.favorite_service import migrate_embedded_favorites, reconcile_favorite_counts
+
+def migrate(batch_size=500):
+    """将用户文档中内嵌的收藏列表迁移到 favorites 集合并重算商品收藏数（可重复执行，只处理尚未迁移的用户）"""
+    app = create_app(background_jobs_enabled=False)
+    with app.app_context():
+        migrated = migrate_embedded_favorites(batch_size)
+        items = reconcile_favorite_counts()
+        print(f"迁移完成，共迁移 {migrated} 个用户的收藏，{items} 个商品有收藏记录")
+
+if __name__ == '__main__':
+    # 用法: python migrate_favorites.py [批大小]
+    migrate(int(sys.argv[1]) if len(sys.argv) > 1 else 500)
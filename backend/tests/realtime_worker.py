@@ -0,0 +1,66 @@
+"""集群模式集成测试的工作进程，两个进程连接同一个 Redis：
+
+    python realtime_worker.py serve <REDIS_URL> <端口>    创建测试用户，输出其 ID 和令牌，然后提供 Socket.IO 服务
+    python realtime_worker.py emit <REDIS_URL> <用户ID>   输出该用户是否在线，然后向其房间推送一条消息
+"""
+import json
+import os
+import sys
+
+os.environ.setdefault('SOCKETIO_ASYNC_MODE', 'threading')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import mongomock
+from config import Config
+
+
+class ClusterConfig(Config):
+    TESTING = True
+    DEBUG = False
+    REALTIME_CLUSTERED = True
+    MONGODB_SETTINGS = {'db': 'test', 'host': 'mongodb://localhost', 'mongo_client_class': mongomock.MongoClient}
+
+
+REPLY_PREFIX = 'WORKER-REPLY '
+
+
+def reply(data):
+    # 应用本身也会向标准输出打印日志，结果行加前缀以便测试识别
+    print(REPLY_PREFIX + json.dumps(data), flush=True)
+
+
+def serve(app, socketio, port):
+    from flask_jwt_extended import create_access_token
+    from app.models.user_model import User
+
+    user = User(username='cluster', email='cluster@example.com')
+    user.set_password('password')
+    user.save()
+    with app.app_context():
+        reply({'user_id': str(user.id), 'token': create_access_token(identity=str(user.id))})
+    socketio.run(app, host='127.0.0.1', port=int(port), allow_unsafe_werkzeug=True, use_reloader=False)
+
+
+def emit(socketio, user_id):
+    from app.services.session_registry import session_registry
+
+    reply({'online': session_registry.is_online(user_id)})
+    # 与 REST 路由相同的推送方式：经 Redis 消息队列转发给其他进程中的连接
+    socketio.emit('new_message', {'content': 'from worker 2', 'pid': os.getpid()}, room=user_id)
+    # socketio 的后台任务不是守护线程，推送完成后直接退出
+    os._exit(0)
+
+
+def main(mode, redis_url, arg):
+    from app import create_app, socketio
+
+    ClusterConfig.REDIS_URL = redis_url
+    app = create_app(ClusterConfig, background_jobs_enabled=False)
+    if mode == 'serve':
+        serve(app, socketio, arg)
+    else:
+        emit(socketio, arg)
+
+
+if __name__ == '__main__':
+    main(*sys.argv[1:4])
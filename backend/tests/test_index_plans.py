@@ -0,0 +1,56 @@
+import datetime
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pymongo = pytest.importorskip('pymongo')
+mongoengine = pytest.importorskip('mongoengine')
+
+# explain 需要真实的 MongoDB（mongomock 不生成查询计划），连接不上时跳过
+MONGO_URI = os.environ.get('TEST_MONGO_URI', 'mongodb://localhost:27017')
+TEST_DB = 'community_marketplace_index_test'
+
+
+@pytest.fixture(scope='module')
+def items():
+    client = pymongo.MongoClient(MONGO_URI, serverSelectionTimeoutMS=1000)
+    try:
+        client.admin.command('ping')
+    except pymongo.errors.PyMongoError as e:
+        pytest.skip(f"MongoDB is not reachable at {MONGO_URI}: {e}")
+    client.drop_database(TEST_DB)
+
+    from app.models.item_model import Item
+    from app.services.index_planner import reconcile_indexes
+
+    mongoengine.connect(db=TEST_DB, host=MONGO_URI, alias='default')
+    now = datetime.datetime.utcnow()
+    Item._get_collection().insert_many([{
+        'title': f'item {i}',
+        'description': 'description',
+        'price': float(i),
+        'category': ('electronics', 'books', 'clothing')[i % 3],
+        'created_at': now - datetime.timedelta(minutes=i),
+        'updated_at': now,
+        'status': ('available', 'sold')[i % 2],
+        'views': i,
+        'favorites_count': i % 5,
+    } for i in range(200)])
+    reconcile_indexes(Item)
+    yield Item
+    mongoengine.disconnect(alias='default')
+    client.drop_database(TEST_DB)
+    client.close()
+
+
+def test_listing_queries_use_indexes(items):
+    """get_items 的每种筛选和排序组合都走索引：没有 COLLSCAN，也没有内存排序 SORT"""
+    from app.services.index_planner import explain_listing_queries
+
+    results = explain_listing_queries()
+    failed = [f"{name}: {' <- '.join(stages)}" for name, stages, ok in results if not ok]
+    assert results
+    assert not failed, '\n'.join(failed)
@@ -0,0 +1,105 @@
+import json
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+simple_websocket = pytest.importorskip('simple_websocket')
+
+WORKER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'realtime_worker.py')
+REPLY_PREFIX = 'WORKER-REPLY '
+
+
+@pytest.fixture
+def redis_url():
+    # 两个工作进程通过 TCP 连接同一个 fakeredis 服务器
+    server = fakeredis.TcpFakeServer(('127.0.0.1', 0), server_type='redis')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    yield f'redis://{host}:{port}/0'
+    server.shutdown()
+
+
+def read_reply(lines):
+    for line in lines:
+        if line.startswith(REPLY_PREFIX):
+            return json.loads(line[len(REPLY_PREFIX):])
+    raise AssertionError('worker exited without a reply')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class SocketClient:
+    """最小的 Socket.IO websocket 客户端（Flask-SocketIO 的测试客户端不支持消息队列）"""
+
+    def __init__(self, port):
+        self.ws = simple_websocket.Client(f'ws://127.0.0.1:{port}/socket.io/?EIO=4&transport=websocket')
+        assert self.ws.receive(timeout=10).startswith('0')  # Engine.IO open
+        self.ws.send('40')  # 连接默认命名空间
+        assert self.wait_for('connect_response')['status'] == 'connected'
+
+    def emit(self, event, data):
+        self.ws.send('42' + json.dumps([event, data]))
+
+    def wait_for(self, event, timeout=10):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            packet = self.ws.receive(timeout=max(deadline - time.time(), 0.1))
+            if packet == '2':
+                self.ws.send('3')  # 回应心跳
+            elif packet and packet.startswith('42'):
+                name, *args = json.loads(packet[2:])
+                if name == event:
+                    return args[0] if args else None
+        return None
+
+    def close(self):
+        self.ws.close()
+
+
+def connect(port, timeout=30):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            return SocketClient(port)
+        except (OSError, simple_websocket.ConnectionError):
+            if time.time() > deadline:
+                raise
+            time.sleep(0.2)
+
+
+def test_presence_and_emit_across_processes(redis_url):
+    """进程 1 中认证的连接在进程 2 中可见为在线，进程 2 推送到用户房间的消息经 Redis 到达进程 1 的连接"""
+    port = free_port()
+    server = subprocess.Popen([sys.executable, WORKER, 'serve', redis_url, str(port)],
+                              stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    client = None
+    try:
+        user = read_reply(server.stdout)
+        client = connect(port)
+        client.emit('authenticate', {'token': user['token']})
+        assert client.wait_for('authenticated')['user_id'] == user['user_id']
+
+        worker = subprocess.run([sys.executable, WORKER, 'emit', redis_url, user['user_id']],
+                                capture_output=True, text=True, timeout=60)
+        assert worker.returncode == 0, worker.stderr
+        assert read_reply(worker.stdout.splitlines()) == {'online': True}
+
+        message = client.wait_for('new_message')
+        assert message is not None
+        assert message['content'] == 'from worker 2'
+        assert message['pid'] != server.pid
+    finally:
+        if client is not None:
+            client.close()
+        server.terminate()
+        server.wait(timeout=10)